@@ -1,4 +1,5 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity, get_jwt
 from flask_socketio import SocketIO, emit, join_room, leave_room
@@ -16,12 +17,43 @@ import uuid
 import threading
 import time
 from bson.json_util import dumps
+import orjson
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for faster jsonify/request.get_json.
+
+    Output keeps Flask's format: datetimes are passed through to
+    self.default (HTTP date strings), sort_keys is honoured and indent=2
+    is supported. Any other json.dumps option falls back to the default
+    provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        options = dict(kwargs)
+        default = options.pop('default', self.default)
+        sort_keys = options.pop('sort_keys', self.sort_keys)
+        indent = options.pop('indent', None)
+        separators = options.pop('separators', None)
+        if options or indent not in (None, 2) or separators not in (None, (',', ':')):
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
+
 # JWT Configuration with consistent secret key
 JWT_SECRET = os.getenv('JWT_SECRET_KEY', 'tmis-business-guru-secret-key-2024')
 app.config['JWT_SECRET_KEY'] = JWT_SECRET
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
 import re
@@ -21,30 +21,38 @@ except Exception as e:
 # Create Blueprint
 chatbot_bp = Blueprint('chatbot', __name__)
 
+def _parse_chat_request():
+    """Validate a chat request; returns (message, None) or (None, error response)"""
+    if not CHATBOT_SERVICE_AVAILABLE or not gemini_chatbot_service:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Chatbot service is not available'
+        }), 503)
+    
+    data = request.get_json()
+    if not data or 'message' not in data:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Message is required'
+        }), 400)
+    
+    user_message = data['message'].strip()
+    if not user_message:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Message cannot be empty'
+        }), 400)
+    
+    return user_message, None
+
 @chatbot_bp.route('/api/chatbot/chat', methods=['POST'])
 @jwt_required()
 def chat():
     """Main chatbot endpoint for handling user queries"""
     try:
-        if not CHATBOT_SERVICE_AVAILABLE or not gemini_chatbot_service:
-            return jsonify({
-                'success': False,
-                'error': 'Chatbot service is not available'
-            }), 503
-        
-        data = request.get_json()
-        if not data or 'message' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Message is required'
-            }), 400
-        
-        user_message = data['message'].strip()
-        if not user_message:
-            return jsonify({
-                'success': False,
-                'error': 'Message cannot be empty'
-            }), 400
+        user_message, error_response = _parse_chat_request()
+        if error_response:
+            return error_response
         
         # Get current user identity
         current_user = get_jwt_identity()
@@ -77,6 +85,41 @@ def chat():
             'error': f'An error occurred while processing your request: {str(e)}'
         }), 500
 
+@chatbot_bp.route('/api/chatbot/chat/stream', methods=['POST'])
+@jwt_required()
+def chat_stream():
+    """Chatbot endpoint that streams the AI response as plain text while it is generated"""
+    try:
+        user_message, error_response = _parse_chat_request()
+        if error_response:
+            return error_response
+        
+        current_user = get_jwt_identity()
+        logger.info(f"Streaming chatbot query from user {current_user}: {user_message}")
+        
+        query_analysis = analyze_query(user_message)
+        
+        if query_analysis['type'] == 'specific_query':
+            # Lookups are a single database read; nothing to stream
+            response = gemini_chatbot_service.process_specific_query(
+                query_analysis['query_type'], 
+                query_analysis['parameters']
+            )
+            return Response(response, mimetype='text/plain')
+        
+        context_type = query_analysis.get('context_type')
+        return Response(
+            stream_with_context(gemini_chatbot_service.stream_response(user_message, context_type)),
+            mimetype='text/plain'
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in chatbot stream endpoint: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'An error occurred while processing your request: {str(e)}'
+        }), 500
+
 @chatbot_bp.route('/api/chatbot/enquiry-stats', methods=['GET'])
 @jwt_required()
 def get_enquiry_stats():
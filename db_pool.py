@@ -0,0 +1,26 @@
+"""
+Shared MongoDB client - one connection pool per process
+"""
+
+import os
+import functools
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+@functools.lru_cache(maxsize=1)
+def get_client():
+    """Return the process-wide MongoClient, created on first use.
+
+    connect=False defers the connection (and its monitor threads) to the
+    first operation, so importing this before gunicorn forks is safe.
+    """
+    return MongoClient(
+        os.getenv('MONGODB_URI'),
+        maxPoolSize=50,
+        minPoolSize=5,
+        serverSelectionTimeoutMS=5000,
+        connect=False
+    )
@@ -1,12 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from pymongo import MongoClient
+from pymongo import MongoClient, WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson import ObjectId
 from datetime import datetime
 import os
+import re
 import logging
 import time
+import queue
+import threading
+import concurrent.futures
+from functools import lru_cache
 from dotenv import load_dotenv
+from socketio_handlers import STAFF_ENQUIRIES_ROOM
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +22,45 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Webhook interest matcher, compiled once at import
+# "interested" covers "I am interested" / "I'm interested" as well
+_INTERESTED_RE = re.compile(r"interested", re.IGNORECASE)
+
+# Deletion table that strips non-digit characters from WhatsApp chat IDs
+_NON_DIGIT_TABLE = str.maketrans('', '', ''.join(chr(c) for c in range(256) if not chr(c).isdigit()))
+
+# app imports the blueprints, so socketio is bound lazily on first use
+_socketio = None
+def _get_socketio():
+    """Return app.socketio, importing it once"""
+    global _socketio
+    if _socketio is None:
+        from app import socketio as _s
+        _socketio = _s
+    return _socketio
+
+# Background worker threads, keyed by target function. They are started
+# lazily: gunicorn preloads the app, and threads don't survive the fork
+_workers = {}
+_workers_lock = threading.Lock()
+
+def _ensure_worker(target):
+    """Start target on a daemon thread unless it is already running in this process"""
+    thread = _workers.get(target)
+    if thread is None or not thread.is_alive():
+        with _workers_lock:
+            thread = _workers.get(target)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=target, name=target.__name__.strip('_'), daemon=True)
+                thread.start()
+                _workers[target] = thread
+
+# Socket.IO fan-out runs here so webhook responses to GreenAPI aren't held up
+_notify_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='wh-notify')
+
+# Outbound GreenAPI replies to webhook messages, sent after the webhook returns
+_reply_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='wh-reply')
+
 # Import GreenAPI WhatsApp service (with corrected endpoint)
 whatsapp_service = None
 try:
@@ -58,7 +104,17 @@ try:
         raise ValueError("MONGODB_URI environment variable is required")
     
     logger.info(f"Connecting to MongoDB Atlas...")
-    client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)  # 5 second timeout
+    # One pooled client per process, sized for bursts of webhook traffic
+    client = MongoClient(
+        mongodb_uri,
+        serverSelectionTimeoutMS=5000,  # 5 second timeout
+        maxPoolSize=50,
+        minPoolSize=10,
+        waitQueueTimeoutMS=2000,
+        socketTimeoutMS=5000,
+        retryWrites=True,
+        compressors='zstd,zlib'
+    )
     
     # Test connection
     client.admin.command('ping')
@@ -70,12 +126,24 @@ try:
     # Create collections
     enquiries_collection = db.enquiries
     users_collection = db.users
+    # Webhook inserts only need a primary ack: GreenAPI redelivers anything
+    # lost on failover. CRUD endpoints keep the default write concern.
+    webhook_enquiries_collection = enquiries_collection.with_options(
+        write_concern=WriteConcern(w=1, j=False)
+    )
     
     # Create indexes for better performance
     try:
         enquiries_collection.create_index("mobile_number")
         enquiries_collection.create_index("date")
         enquiries_collection.create_index("staff")
+        # GreenAPI message IDs are globally unique; the partial filter leaves
+        # out enquiries stored with an empty/missing message ID
+        enquiries_collection.create_index(
+            [('whatsapp_message_id', 1)],
+            unique=True,
+            partialFilterExpression={'whatsapp_message_id': {'$gt': ''}}
+        )
         logger.info("Created indexes for enquiries collection")
     except Exception as index_error:
         logger.warning(f"Index creation warning: {index_error}")
@@ -88,6 +156,7 @@ except Exception as e:
     # Don't raise exception, just set collections to None
     db = None
     enquiries_collection = None
+    webhook_enquiries_collection = None
     users_collection = None
 
 def serialize_enquiry(enquiry):
@@ -1060,9 +1129,7 @@ def test_whatsapp():
             return jsonify(response_data), final_status_code
             
     except Exception as e:
-        logger.error(f"Error testing WhatsApp: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error testing WhatsApp: %s", e)
         return jsonify({'error': f'WhatsApp test failed: {str(e)}'}), 500
 
 @enquiry_bp.route('/whatsapp/test-unlimited', methods=['POST'])
@@ -1178,11 +1245,22 @@ def test_whatsapp_greenapi():
             }), 400
             
     except Exception as e:
-        logger.error(f"Error testing GreenAPI WhatsApp: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error testing GreenAPI WhatsApp: %s", e)
         return jsonify({'error': f'GreenAPI WhatsApp test failed: {str(e)}'}), 500
 
+# Last GreenAPI status seen by the debug endpoint; monitoring loops poll it
+# every few seconds, so only refresh it once the TTL has passed
+_STATUS_CACHE_TTL = 5
+_status_cache = {'t': 0.0, 'v': None}
+
+def _cached_whatsapp_status():
+    """Return whatsapp_service.check_status(), cached for _STATUS_CACHE_TTL seconds"""
+    now = time.monotonic()
+    if _status_cache['v'] is None or now - _status_cache['t'] > _STATUS_CACHE_TTL:
+        _status_cache['v'] = whatsapp_service.check_status()
+        _status_cache['t'] = now
+    return _status_cache['v']
+
 @enquiry_bp.route('/whatsapp/debug', methods=['GET'])
 @jwt_required()
 def debug_whatsapp_service():
@@ -1195,16 +1273,17 @@ def debug_whatsapp_service():
         }
         
         if whatsapp_service is not None:
+            service_vars = vars(whatsapp_service)
             debug_info.update({
-                'api_available': getattr(whatsapp_service, 'api_available', False),
-                'instance_id': getattr(whatsapp_service, 'instance_id', None),
-                'base_url': getattr(whatsapp_service, 'base_url', None),
-                'has_token': bool(getattr(whatsapp_service, 'token', None))
+                'api_available': service_vars.get('api_available', False),
+                'instance_id': service_vars.get('instance_id'),
+                'base_url': service_vars.get('base_url'),
+                'has_token': bool(service_vars.get('token'))
             })
             
             # Try to check status
             try:
-                status = whatsapp_service.check_status()
+                status = _cached_whatsapp_status()
                 debug_info['connection_status'] = status
             except Exception as status_error:
                 debug_info['connection_status'] = {'error': str(status_error)}
@@ -1230,17 +1309,16 @@ def get_whatsapp_templates():
             
         templates = whatsapp_service.get_message_templates()
         
-        # Return template names and preview of messages
-        template_info = {}
-        for template_name, template_content in templates.items():
-            # Show first 100 characters as preview
-            preview = template_content.replace('{wati_name}', '[Customer Name]')
-            preview = preview.replace('{comments}', '[Status]')
-            template_info[template_name] = {
-                'name': template_name,
-                'preview': preview[:100] + '...' if len(preview) > 100 else preview,
-                'full_template': template_content
-            }
+        # Templates rarely change, so reuse the previews built for the same
+        # template set instead of re-rendering them on every request
+        templates_key = tuple(templates.items())
+        global _template_info_cache
+        cached = _template_info_cache
+        if cached is not None and cached[0] == templates_key:
+            template_info = cached[1]
+        else:
+            template_info = _build_template_info(templates)
+            _template_info_cache = (templates_key, template_info)
         
         return jsonify({
             'templates': template_info,
@@ -1251,24 +1329,50 @@ def get_whatsapp_templates():
         logger.error(f"Error getting WhatsApp templates: {str(e)}")
         return jsonify({'error': f'Failed to get templates: {str(e)}'}), 500
 
+# Placeholder substitutions used for template previews, applied in one pass
+_PREVIEW_SUBS = {'{wati_name}': '[Customer Name]', '{comments}': '[Status]'}
+_PREVIEW_RE = re.compile(r'\{wati_name\}|\{comments\}')
+
+def _preview_sub(match):
+    return _PREVIEW_SUBS[match.group(0)]
+
+# (template items, built previews) for the last template set served
+_template_info_cache = None
+
+def _build_template_info(templates):
+    """Build template names and a preview of each message"""
+    template_info = {}
+    for template_name, template_content in templates.items():
+        # Show first 100 characters as preview
+        preview = _PREVIEW_RE.sub(_preview_sub, template_content)
+        template_info[template_name] = {
+            'name': template_name,
+            'preview': preview[:100] + '...' if len(preview) > 100 else preview,
+            'full_template': template_content
+        }
+    return template_info
+
 # Add a simple test endpoint to verify the new code is running
 # Force redeployment comment added 2025-10-09
 @enquiry_bp.route('/enquiries/whatsapp/webhook/test', methods=['GET'])
 def test_webhook_handler():
     """Test endpoint to verify the new webhook handler is running"""
-    return jsonify({
-        'status': 'success',
-        'message': 'Enhanced webhook handler is running with username capture fix',
-        'version': '2.1',
-        'timestamp': datetime.utcnow().isoformat(),
-        'features': [
-            'WhatsApp username capture',
-            'Enhanced mobile number extraction', 
-            'Duplicate prevention',
-            'Comprehensive logging',
-            'Multiple sender name field support'
-        ]
-    }), 200
+    return Response(_TEST_HANDLER_BODY_TMPL % datetime.utcnow().isoformat().encode(), mimetype='application/json')
+
+# GreenAPI liveness probes hit the endpoints below constantly and their bodies
+# only vary by timestamp, so they are pre-serialized with a %s slot for it
+_TEST_HANDLER_BODY_TMPL = (
+    b'{"status":"success",'
+    b'"message":"Enhanced webhook handler is running with username capture fix",'
+    b'"version":"2.1","timestamp":"%s",'
+    b'"features":["WhatsApp username capture","Enhanced mobile number extraction",'
+    b'"Duplicate prevention","Comprehensive logging","Multiple sender name field support"]}'
+)
+_WEBHOOK_GET_BODY_TMPL = (
+    b'{"status":"webhook_endpoint_active",'
+    b'"message":"Webhook endpoint is ready to receive POST requests from GreenAPI",'
+    b'"timestamp":"%s","method_received":"GET","expected_method":"POST"}'
+)
 
 @enquiry_bp.route('/enquiries/whatsapp/webhook/test-data', methods=['POST'])
 def test_webhook_with_data():
@@ -1303,7 +1407,7 @@ def test_webhook_with_data():
         
         # Clean mobile number
         sender_number = chat_id.replace('@c.us', '')
-        clean_number = ''.join(filter(str.isdigit, sender_number))
+        clean_number = sender_number.translate(_NON_DIGIT_TABLE)
         
         # Determine display name
         if sender_name and sender_name.strip():
@@ -1322,7 +1426,7 @@ def test_webhook_with_data():
                 'original_chat_id': chat_id,
                 'message_text': message_text
             },
-            'would_create_enquiry': message_info.get('has_message_data', False) and _is_interested_message(message_text),
+            'would_create_enquiry': message_info.get('has_message_data', False) and _is_interested_message(message_text.strip().lower()),
             'timestamp': datetime.utcnow().isoformat()
         }), 200
         
@@ -1334,39 +1438,66 @@ def test_webhook_with_data():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+def _emit_notification(notification, event='webhook_notification'):
+    """Emit a Socket.IO notification; runs on _notify_executor"""
+    try:
+        _get_socketio().emit(event, notification)
+    except Exception as socket_error:
+        logger.error(f"❌ Error emitting socket event: {socket_error}")
+
+def _send_reply(chat_id, message_text, response_text):
+    """Send a reply-option response via GreenAPI; runs on _reply_executor"""
+    try:
+        result = whatsapp_service.send_message(chat_id, response_text)
+    except Exception as send_error:
+        logger.error(f"❌ Failed to send reply for option '{message_text}' to {chat_id}: {send_error}")
+        return
+    
+    if result['success']:
+        logger.info(f"✅ Reply sent for option '{message_text}' to {chat_id}")
+    else:
+        logger.error(f"❌ Failed to send reply for option '{message_text}' to {chat_id}: {result.get('error')}")
+        # Log additional error details
+        logger.error(f"❌ Error details: {result}")
+        
+        # Check for quota exceeded error
+        error_msg = result.get('error', '').lower()
+        status_code = result.get('status_code', 0)
+        
+        if 'quota exceeded' in error_msg or 'monthly quota' in error_msg or status_code == 466:
+            logger.warning(f"⚠️ GreenAPI quota exceeded when sending reply to {chat_id}")
+
 @enquiry_bp.route('/enquiries/whatsapp/webhook', methods=['GET', 'POST'])
 def handle_incoming_whatsapp():
     """Handle incoming WhatsApp messages from GreenAPI webhook"""
     
     # Handle GET requests for testing
     if request.method == 'GET':
-        logger.info(f"🔍 GET request to webhook endpoint from {request.remote_addr}")
-        return jsonify({
-            'status': 'webhook_endpoint_active',
-            'message': 'Webhook endpoint is ready to receive POST requests from GreenAPI',
-            'timestamp': datetime.utcnow().isoformat(),
-            'method_received': 'GET',
-            'expected_method': 'POST'
-        }), 200
+        logger.info("🔍 GET request to webhook endpoint from %s", request.remote_addr)
+        return Response(_WEBHOOK_GET_BODY_TMPL % datetime.utcnow().isoformat().encode(), mimetype='application/json')
     
     try:
         # Get the incoming data
-        data = request.get_json()
-        
-        # Log ALL incoming requests for debugging
-        logger.info(f"📥 === NEW WEBHOOK REQUEST === {datetime.utcnow().isoformat()}")
-        logger.info(f"📥 Request Headers: {dict(request.headers)}")
-        logger.info(f"📥 Request Method: {request.method}")
-        logger.info(f"📥 Request URL: {request.url}")
-        logger.info(f"📥 Raw Data: {request.get_data(as_text=True)}")
-        logger.info(f"📥 Parsed JSON Data: {data}")
-        logger.info(f"📥 Data type: {type(data)}")
-        logger.info(f"📥 Data keys: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}")
-        
-        # Always return success for debugging - even for non-message events
-        # This helps us see what GreenAPI is actually sending
-        if not data:
-            logger.warning("⚠️ Empty webhook data received - but responding with success")
+        data = request.get_json(silent=True)
+        
+        # State changes, device info and other non-message events arrive often
+        # and are ignored, so answer them before any logging or extraction
+        if isinstance(data, dict):
+            webhook_type = data.get('typeWebhook', '')
+            if webhook_type and webhook_type not in _FORMAT_HANDLERS:
+                return '', 204
+        
+        # Log ALL incoming requests for debugging; gated because the raw body
+        # decode and key listing cost something even when INFO is off
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("📥 === NEW WEBHOOK REQUEST === %s", datetime.utcnow().isoformat())
+            logger.debug("📥 Request Headers: %s", request.headers)
+            logger.info("📥 Request Method: %s", request.method)
+            logger.info("📥 Request URL: %s", request.url)
+            logger.info("📥 Raw Data: %s", request.get_data(as_text=True))
+            logger.info("📥 Parsed JSON Data: %s", data)
+            logger.info("📥 Data type: %s", type(data))
+            logger.info("📥 Data keys: %s", list(data.keys()) if isinstance(data, dict) else 'Not a dict')
         
         # Handle empty data
         if not data:
@@ -1376,42 +1507,30 @@ def handle_incoming_whatsapp():
                 'message': 'Empty data received'
             }), 200
         
-        # Check if this is a state change notification or other non-message event (ignore these)
         webhook_type = data.get('typeWebhook', '')
-        logger.info(f"🔍 Webhook type: '{webhook_type}'")
-        
-        if webhook_type and webhook_type not in ['incomingMessageReceived', 'outgoingMessageReceived']:
-            logger.info(f"ℹ️ Non-message webhook event received: {webhook_type}")
-            return jsonify({
-                'success': True,
-                'message': f'Webhook event {webhook_type} received and ignored'
-            }), 200
+        logger.info("🔍 Webhook type: '%s'", webhook_type)
         
         # Extract message information from various possible formats
         message_info = _extract_message_info(data)
-        logger.info(f"📦 Extracted message info: {message_info}")
+        logger.info("📦 Extracted message info: %s", message_info)
         
         # If we couldn't extract message info, it might be a non-message event
         if not message_info.get('has_message_data'):
             logger.info("ℹ️ No message data found in webhook, ignoring")
             
-            # Emit notification for non-message webhook
-            try:
-                from app import socketio
-                notification = {
-                    'type': 'webhook_status',
-                    'status': 'info',
-                    'message': "🔔 WEBHOOK RECEIVED: Non-message event (state change, status update, etc.)",
-                    'details': {
-                        'webhook_type': data.get('typeWebhook', 'unknown'),
-                        'enquiry_created': False,
-                        'reason': 'Not a message event'
-                    },
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                socketio.emit('webhook_notification', notification)
-            except:
-                pass
+            # Emit notification for non-message webhook (off the request thread)
+            notification = {
+                'type': 'webhook_status',
+                'status': 'info',
+                'message': "🔔 WEBHOOK RECEIVED: Non-message event (state change, status update, etc.)",
+                'details': {
+                    'webhook_type': data.get('typeWebhook', 'unknown'),
+                    'enquiry_created': False,
+                    'reason': 'Not a message event'
+                },
+                'timestamp': datetime.utcnow().isoformat()
+            }
+            _notify_executor.submit(_emit_notification, notification)
             
             return jsonify({
                 'success': True,
@@ -1424,11 +1543,11 @@ def handle_incoming_whatsapp():
         message_id = message_info.get('message_id', '')
         
         # Log the extracted information
-        logger.info(f"📋 Extracted Information:")
-        logger.info(f"   Chat ID: {chat_id}")
-        logger.info(f"   Message Text: {message_text}")
-        logger.info(f"   Sender Name: {sender_name}")
-        logger.info(f"   Message ID: {message_id}")
+        logger.info("📋 Extracted Information:")
+        logger.info("   Chat ID: %s", chat_id)
+        logger.info("   Message Text: %s", message_text)
+        logger.info("   Sender Name: %s", sender_name)
+        logger.info("   Message ID: %s", message_id)
         
         # Check if we have the minimum required data
         if not message_text:
@@ -1439,38 +1558,26 @@ def handle_incoming_whatsapp():
             }), 200
         
         # Log the exact message text for debugging
-        logger.info(f"🔍 Raw message text: '{message_text}'")
-        logger.info(f"🔍 Message text length: {len(message_text)}")
-        logger.info(f"🔍 Message text repr: {repr(message_text)}")
+        logger.info("🔍 Raw message text: '%s'", message_text)
+        logger.info("🔍 Message text length: %d", len(message_text))
+        logger.info("🔍 Message text repr: %r", message_text)
         
-        # Check if this is one of our reply options
-        is_reply_option = _is_reply_option(message_text)
-        logger.info(f"🔍 Is reply option: {is_reply_option}")
+        # Normalize once; the matchers below all work on the normalized text
+        normalized_text = message_text.strip().lower()
         
         # Check if this is one of our reply options
-        if _is_reply_option(message_text):
-            logger.info(f"🔄 Processing reply option from {data.get('senderName', '') or chat_id}: {message_text}")
+        is_reply_option = _is_reply_option(normalized_text)
+        logger.info("🔍 Is reply option: %s", is_reply_option)
+        
+        if is_reply_option:
+            logger.info("🔄 Processing reply option from %s: %s", data.get('senderName', '') or chat_id, message_text)
             # Send appropriate response
-            response_text = _get_reply_response(message_text)
+            response_text = _get_reply_response(normalized_text)
             if whatsapp_service and whatsapp_service.api_available:
-                # Use the proper method to send the message
-                logger.info(f"📤 Sending reply message: {response_text}")
-                result = whatsapp_service.send_message(chat_id, response_text)
-                if result['success']:
-                    logger.info(f"✅ Reply sent for option '{message_text}' to {chat_id}")
-                else:
-                    logger.error(f"❌ Failed to send reply for option '{message_text}' to {chat_id}: {result.get('error')}")
-                    # Log additional error details
-                    logger.error(f"❌ Error details: {result}")
-                    
-                    # Check for quota exceeded error
-                    error_msg = result.get('error', '').lower()
-                    status_code = result.get('status_code', 0)
-                    
-                    if 'quota exceeded' in error_msg or 'monthly quota' in error_msg or status_code == 466:
-                        logger.warning(f"⚠️ GreenAPI quota exceeded when sending reply to {chat_id}")
-                        # Still return success to the webhook (we don't want to cause webhook errors)
-                        # but log the quota issue
+                # Send the reply in the background so GreenAPI gets its 200
+                # without waiting on the outbound sendMessage round-trip
+                logger.info("📤 Sending reply message: %s", response_text)
+                _reply_executor.submit(_send_reply, chat_id, message_text, response_text)
             else:
                 logger.error("❌ WhatsApp service not available")
             return jsonify({
@@ -1479,23 +1586,21 @@ def handle_incoming_whatsapp():
             }), 200
         # Check if this is the "I am interested" message
         else:
-            is_interested = _is_interested_message(message_text)
-            logger.info(f"🔍 Is interested message: {is_interested}")
+            is_interested = _is_interested_message(normalized_text)
+            logger.info("🔍 Is interested message: %s", is_interested)
             
             if is_interested:
-                logger.info(f"✅ Processing interested message from {sender_name or chat_id}: {message_text}")
+                logger.info("✅ Processing interested message from %s: %s", sender_name or chat_id, message_text)
                 return _create_enquiry_from_message(chat_id, message_text, sender_name, message_id)
             else:
-                logger.info(f"📥 Received WhatsApp message but not 'interested' message: {message_text}")
+                logger.info("📥 Received WhatsApp message but not 'interested' message: %s", message_text)
                 return jsonify({
                     'success': True,
                     'message': 'Message received but not processed as enquiry'
                 }), 200
         
     except Exception as e:
-        logger.error(f"❌ Error handling incoming WhatsApp message: {str(e)}")
-        import traceback
-        logger.error(f"❌ Traceback: {traceback.format_exc()}")
+        logger.exception("❌ Error handling incoming WhatsApp message: %s", e)
         return jsonify({
             'success': False,
             'error': f'Error processing webhook: {str(e)}'
@@ -1513,211 +1618,150 @@ def _extract_message_info(data):
     
     try:
         # Log the data structure for debugging
-        logger.info(f"🔍 Extracting message info from data structure: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}")
-        
-        # Handle different GreenAPI webhook formats
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 Extracting message info from data structure: %s", list(data.keys()) if isinstance(data, dict) else 'Not a dict')
         
-        # Format 1: Direct message format (original) - This works
-        if 'message' in data and 'chatId' in data and not data.get('typeWebhook'):
-            logger.info("📦 Processing Format 1: Direct message format")
-            message_data = data['message']
-            result['chat_id'] = data['chatId']
-            result['sender_name'] = data.get('senderName', '')
-            result['message_text'] = message_data.get('textMessage', {}).get('text', '')
-            result['message_id'] = message_data.get('idMessage', '')
-            result['has_message_data'] = True
-            
-        # Format 2: Incoming message received format with messageData
-        elif data.get('typeWebhook') == 'incomingMessageReceived' and 'messageData' in data:
-            logger.info("📦 Processing Format 2: Incoming message with messageData")
-            message_data = data.get('messageData', {})
-            sender_data = data.get('senderData', {})
-            
-            # Extract text message - handle different possible structures
-            if isinstance(message_data, dict):
-                # Check for textMessage structure
-                if 'textMessage' in message_data and isinstance(message_data['textMessage'], dict):
-                    result['message_text'] = message_data['textMessage'].get('text', '')
-                # Check for direct text in messageData
-                elif 'text' in message_data:
-                    result['message_text'] = message_data.get('text', '')
-                
-                # Extract message ID
-                result['message_id'] = message_data.get('idMessage', '')
-                
-            # Extract chat ID and sender name from senderData
-            if isinstance(sender_data, dict):
-                result['chat_id'] = sender_data.get('chatId', '')
-                
-                # Try multiple fields for sender name with priority order
-                sender_name_options = [
-                    sender_data.get('senderName', ''),
-                    sender_data.get('chatName', ''),
-                    sender_data.get('pushName', ''),  # WhatsApp push name
-                    sender_data.get('notifyName', '')  # WhatsApp notify name
-                ]
-                
-                # Use the first non-empty name
-                for name_option in sender_name_options:
-                    if name_option and name_option.strip():
-                        result['sender_name'] = name_option.strip()
-                        break
-                
-                logger.info(f"📋 Sender data fields: {list(sender_data.keys())}")
-                logger.info(f"📋 Selected sender name: '{result['sender_name']}'")
-                
-            result['has_message_data'] = bool(result['message_text'])  # Only mark as having data if there's text
-                
-        # Format 3: Incoming message received format with direct message
-        elif data.get('typeWebhook') == 'incomingMessageReceived' and 'message' in data:
-            logger.info("📦 Processing Format 3: Incoming message with direct message")
-            msg = data['message']
-            sender_data = data.get('senderData', {})
-            
-            if isinstance(msg, dict):
-                result['message_text'] = msg.get('textMessage', {}).get('text', '')
-                result['message_id'] = msg.get('idMessage') or msg.get('id', '')
-                
-            # Get sender info from senderData with enhanced name extraction
-            if isinstance(sender_data, dict):
-                result['chat_id'] = sender_data.get('chatId', '')
-                
-                # Try multiple fields for sender name with priority order
-                sender_name_options = [
-                    sender_data.get('senderName', ''),
-                    sender_data.get('chatName', ''),
-                    sender_data.get('pushName', ''),  # WhatsApp push name
-                    sender_data.get('notifyName', '')  # WhatsApp notify name
-                ]
-                
-                # Use the first non-empty name
-                for name_option in sender_name_options:
-                    if name_option and name_option.strip():
-                        result['sender_name'] = name_option.strip()
-                        break
-                        
-                logger.info(f"📋 Sender data fields: {list(sender_data.keys())}")
-                logger.info(f"📋 Selected sender name: '{result['sender_name']}'")
-                
-            result['has_message_data'] = bool(result['message_text'])
-            
-        # Format 4: Alternative format with text directly in data
-        elif data.get('typeWebhook') == 'incomingMessageReceived' and 'text' in data:
-            logger.info("📦 Processing Format 4: Direct text format")
-            result['message_text'] = data.get('text', '')
-            result['message_id'] = data.get('idMessage', '')
-            
-            sender_data = data.get('senderData', {})
-            if isinstance(sender_data, dict):
-                result['chat_id'] = sender_data.get('chatId', '')
-                
-                # Try multiple fields for sender name with priority order
-                sender_name_options = [
-                    sender_data.get('senderName', ''),
-                    sender_data.get('chatName', ''),
-                    sender_data.get('pushName', ''),  # WhatsApp push name
-                    sender_data.get('notifyName', '')  # WhatsApp notify name
-                ]
-                
-                # Use the first non-empty name
-                for name_option in sender_name_options:
-                    if name_option and name_option.strip():
-                        result['sender_name'] = name_option.strip()
-                        break
-                        
-                logger.info(f"📋 Sender data fields: {list(sender_data.keys())}")
-                logger.info(f"📋 Selected sender name: '{result['sender_name']}'")
-                
-            result['has_message_data'] = bool(result['message_text'])
-            
-        # Format 5: Outgoing message format (when you send to yourself)
-        elif data.get('typeWebhook') == 'outgoingMessageReceived' and 'messageData' in data:
-            logger.info("📦 Processing Format 5: Outgoing message format (self-message)")
-            message_data = data.get('messageData', {})
-            sender_data = data.get('senderData', {})
-            
-            # Extract text from textMessageData structure
-            if isinstance(message_data, dict):
-                text_data = message_data.get('textMessageData', {})
-                if isinstance(text_data, dict):
-                    result['message_text'] = text_data.get('textMessage', '')
-                
-                # Get message ID from root level
-                result['message_id'] = data.get('idMessage', '')
-                
-            # Extract sender info
-            if isinstance(sender_data, dict):
-                result['chat_id'] = sender_data.get('chatId', '')
-                
-                # Try multiple fields for sender name
-                sender_name_options = [
-                    sender_data.get('senderName', ''),
-                    sender_data.get('chatName', ''),
-                    sender_data.get('senderContactName', ''),
-                    sender_data.get('sender', '').replace('@c.us', '')
-                ]
-                
-                # Use the first non-empty name
-                for name_option in sender_name_options:
-                    if name_option and name_option.strip():
-                        result['sender_name'] = name_option.strip()
-                        break
-                        
-                logger.info(f"📋 Outgoing message sender data: {list(sender_data.keys())}")
-                logger.info(f"📋 Selected sender name: '{result['sender_name']}'")
-                
-            result['has_message_data'] = bool(result['message_text'])
-            
-        # Format 6: State change or other notifications (no message data)
-        elif data.get('typeWebhook') and 'message' not in data and 'messageData' not in data:
-            logger.info("📦 Processing Format 6: Non-message event")
-            # This is likely a state change or other notification, not a message
-            result['has_message_data'] = False
+        # Dispatch on the webhook type; payloads without a known type go
+        # through the legacy handler
+        _FORMAT_HANDLERS.get(data.get('typeWebhook'), _extract_legacy)(data, result)
             
         # Log what we extracted
-        logger.info(f"📤 Extracted data: {result}")
+        logger.debug("📤 Extracted data: %s", result)
             
     except Exception as e:
-        logger.error(f"Error extracting message info: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error extracting message info: %s", e)
     
     return result
 
-def _is_interested_message(message_text):
-    """Check if the message indicates interest"""
-    if not message_text:
-        return False
-    text_lower = message_text.lower()
-    return "i am interested" in text_lower or "interested" in text_lower or "i'm interested" in text_lower
+# senderData name fields in priority order (pushName/notifyName are the
+# WhatsApp push and notify names)
+_SENDER_NAME_KEYS = ('senderName', 'chatName', 'pushName', 'notifyName')
+_OUTGOING_SENDER_NAME_KEYS = ('senderName', 'chatName', 'senderContactName')
 
-def _is_reply_option(message_text):
-    """Check if the message is one of the reply options"""
-    if not message_text:
-        return False
-    # Normalize the text for comparison
-    text_normalized = message_text.lower().strip()
-    logger.info(f"🔍 Checking if '{message_text}' is a reply option (normalized: '{text_normalized}')")
+def _pick_sender_name(sender_data, keys=_SENDER_NAME_KEYS):
+    """Return the first non-empty sender name from GreenAPI senderData"""
+    return next((v.strip() for k in keys if (v := sender_data.get(k)) and v.strip()), '')
+
+def _extract_incoming(data, result):
+    """Extract an incomingMessageReceived webhook (Formats 2, 3 and 4)"""
+    # Format 2: Incoming message received format with messageData
+    if 'messageData' in data:
+        logger.info("📦 Processing Format 2: Incoming message with messageData")
+        message_data = data.get('messageData', {})
+        
+        # Extract text message - handle different possible structures
+        if isinstance(message_data, dict):
+            # Check for textMessage structure
+            if 'textMessage' in message_data and isinstance(message_data['textMessage'], dict):
+                result['message_text'] = message_data['textMessage'].get('text', '')
+            # Check for direct text in messageData
+            elif 'text' in message_data:
+                result['message_text'] = message_data.get('text', '')
+            
+            # Extract message ID
+            result['message_id'] = message_data.get('idMessage', '')
+    
+    # Format 3: Incoming message received format with direct message
+    elif 'message' in data:
+        logger.info("📦 Processing Format 3: Incoming message with direct message")
+        msg = data['message']
+        
+        if isinstance(msg, dict):
+            result['message_text'] = msg.get('textMessage', {}).get('text', '')
+            result['message_id'] = msg.get('idMessage') or msg.get('id', '')
+    
+    # Format 4: Alternative format with text directly in data
+    elif 'text' in data:
+        logger.info("📦 Processing Format 4: Direct text format")
+        result['message_text'] = data.get('text', '')
+        result['message_id'] = data.get('idMessage', '')
+    
+    else:
+        return
+    
+    # Extract chat ID and sender name from senderData
+    sender_data = data.get('senderData', {})
+    if isinstance(sender_data, dict):
+        result['chat_id'] = sender_data.get('chatId', '')
+        result['sender_name'] = _pick_sender_name(sender_data)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📋 Sender data fields: %s", list(sender_data.keys()))
+            logger.debug("📋 Selected sender name: '%s'", result['sender_name'])
     
-    reply_options = ['get loan', 'check eligibility', 'more details']
-    is_reply = text_normalized in reply_options
+    result['has_message_data'] = bool(result['message_text'])  # Only mark as having data if there's text
+
+def _extract_outgoing(data, result):
+    """Extract an outgoingMessageReceived webhook (Format 5)"""
+    # Format 5: Outgoing message format (when you send to yourself)
+    if 'messageData' not in data:
+        return
     
-    logger.info(f"🔍 Is reply option: {is_reply}")
-    if is_reply:
-        logger.info(f"🔍 Matched reply option: {text_normalized}")
+    logger.info("📦 Processing Format 5: Outgoing message format (self-message)")
+    message_data = data.get('messageData', {})
+    sender_data = data.get('senderData', {})
     
-    return is_reply
+    # Extract text from textMessageData structure
+    if isinstance(message_data, dict):
+        text_data = message_data.get('textMessageData', {})
+        if isinstance(text_data, dict):
+            result['message_text'] = text_data.get('textMessage', '')
+        
+        # Get message ID from root level
+        result['message_id'] = data.get('idMessage', '')
+    
+    # Extract sender info
+    if isinstance(sender_data, dict):
+        result['chat_id'] = sender_data.get('chatId', '')
+        result['sender_name'] = (
+            _pick_sender_name(sender_data, _OUTGOING_SENDER_NAME_KEYS)
+            or sender_data.get('sender', '').replace('@c.us', '').strip()
+        )
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📋 Outgoing message sender data: %s", list(sender_data.keys()))
+            logger.debug("📋 Selected sender name: '%s'", result['sender_name'])
+    
+    result['has_message_data'] = bool(result['message_text'])
 
-def _get_reply_response(message_text):
-    """Get the appropriate response for reply options"""
-    text_lower = message_text.lower().strip()
+def _extract_legacy(data, result):
+    """Extract a payload without a known webhook type (Formats 1 and 6)"""
+    # Format 1: Direct message format (original) - This works
+    if 'message' in data and 'chatId' in data and not data.get('typeWebhook'):
+        logger.info("📦 Processing Format 1: Direct message format")
+        message_data = data['message']
+        result['chat_id'] = data['chatId']
+        result['sender_name'] = data.get('senderName', '')
+        result['message_text'] = message_data.get('textMessage', {}).get('text', '')
+        result['message_id'] = message_data.get('idMessage', '')
+        result['has_message_data'] = True
     
-    responses = {
-        'get loan': """Business Guru is banking associate for loans especially business loans.
+    # Format 6: State change or other notifications (no message data)
+    elif data.get('typeWebhook') and 'message' not in data and 'messageData' not in data:
+        logger.info("📦 Processing Format 6: Non-message event")
+
+_FORMAT_HANDLERS = {
+    'incomingMessageReceived': _extract_incoming,
+    'outgoingMessageReceived': _extract_outgoing
+}
+
+# The matchers below take message text already normalized by the caller
+# with text.strip().lower()
+
+# Inbound texts repeat a lot ("hi i am interested!"), so the regex result is
+# memoized. The reply-option helpers below are already single hash lookups.
+@lru_cache(maxsize=1024)
+def _is_interested_message(normalized_text):
+    """Check if the message indicates interest"""
+    return bool(normalized_text) and _INTERESTED_RE.search(normalized_text) is not None
+
+# Canned responses for the WhatsApp reply options, built once at import
+_REPLY_RESPONSES = {
+    'get loan': """Business Guru is banking associate for loans especially business loans.
 
 We provide collateral free loans based on turnover for all kinds of business without considering CIBIL scores of the customer/business""",
-        
-        'check eligibility': """📋 Documents Needed for Eligibility Check 
+    
+    'check eligibility': """📋 Documents Needed for Eligibility Check 
 Please share:  
 1️⃣ Business Registration  
 2️⃣ GST Certificate  
@@ -1731,208 +1775,363 @@ Please share:
 - Intl. Payment Gateway 
 - Send photos/PDFs one-by-one  
 We'll verify within 4 hours!""",
-        
-        'more details': """Welcome to Business Guru! We're delighted to have you with us. At Business Guru, we specialize in providing collateral loans to help businesses like yours grow and thrive. Our team of financial experts is ready to assist you with personalized loan solutions tailored to your business needs. We'll be contacting you shortly to discuss your requirements in detail and guide you through our simple application process. 
+    
+    'more details': """Welcome to Business Guru! We're delighted to have you with us. At Business Guru, we specialize in providing collateral loans to help businesses like yours grow and thrive. Our team of financial experts is ready to assist you with personalized loan solutions tailored to your business needs. We'll be contacting you shortly to discuss your requirements in detail and guide you through our simple application process. 
 
 
 """
+}
+
+# Reply options are exactly the response keys, so the two can't drift
+_REPLY_OPTIONS = frozenset(_REPLY_RESPONSES)
+
+def _is_reply_option(normalized_text):
+    """Check if the message is one of the reply options"""
+    return normalized_text in _REPLY_OPTIONS
+
+_REPLY_DEFAULT = "I didn't understand that. Please reply with one of these options: Get Loan, Check Eligibility, or More Details"
+
+def _get_reply_response(normalized_text):
+    """Get the appropriate response for reply options"""
+    return _REPLY_RESPONSES.get(normalized_text, _REPLY_DEFAULT)
+
+# new_enquiry + webhook_notification pairs can be coalesced into a single
+# 'new_enquiries_batch' event flushed every _EMIT_BATCH_INTERVAL seconds.
+# Opt-in (SOCKET_BATCH_EMITS=true) until every frontend listens for it.
+_BATCH_SOCKET_EMITS = os.getenv('SOCKET_BATCH_EMITS', 'false').lower() == 'true'
+_EMIT_BATCH_INTERVAL = 0.1
+_pending_emits = []
+_pending_emits_lock = threading.Lock()
+
+def _emit_flusher():
+    """Emit queued enquiry announcements as one batch event per interval"""
+    while True:
+        time.sleep(_EMIT_BATCH_INTERVAL)
+        with _pending_emits_lock:
+            if not _pending_emits:
+                continue
+            batch = _pending_emits[:]
+            _pending_emits.clear()
+        try:
+            _get_socketio().emit('new_enquiries_batch', batch, room=STAFF_ENQUIRIES_ROOM)
+        except Exception as socket_error:
+            logger.error(f"❌ Error emitting enquiry batch: {socket_error}")
+
+# Static parts of the webhook_status notification sent with a new enquiry
+_STATUS_NOTIF_BASE = {'type': 'webhook_status'}
+_STATUS_DETAILS_BASE = {
+    'greenapi_plan': 'free',
+    'whatsapp_account_type': 'normal',
+    'enquiry_created': True
+}
+
+def _has_listeners():
+    """Check whether any dashboard is connected to receive enquiry events"""
+    # Every client joins the staff room on connect; the in-process manager
+    # tracks this worker's own clients, which are the only ones it can reach.
+    # The enquiry is already persisted by now, so a failure here must not
+    # bubble up into the webhook response or the persist worker's loop
+    try:
+        rooms = _get_socketio().server.manager.rooms
+        return bool(rooms.get('/', {}).get(STAFF_ENQUIRIES_ROOM))
+    except Exception as listener_error:
+        logger.warning("⚠️ Could not check socket listeners: %s", listener_error)
+        return False
+
+def _announce_enquiry(socket_data, status_notification):
+    """Tell the frontend about a new enquiry, batched when enabled"""
+    if _BATCH_SOCKET_EMITS:
+        _ensure_worker(_emit_flusher)
+        with _pending_emits_lock:
+            _pending_emits.append({'enquiry': socket_data, 'status': status_notification})
+        return
+    
+    socketio = _get_socketio()
+    socketio.emit('new_enquiry', socket_data, room=STAFF_ENQUIRIES_ROOM)
+    socketio.emit('webhook_notification', status_notification)
+
+def _build_enquiry_notification(enquiry, clean_number, sender_name_valid, timestamp):
+    """Build the new_enquiry payload and webhook_status notification for an enquiry"""
+    # Determine the status message based on data availability
+    if sender_name_valid:
+        status_message = "✅ SUCCESS: WhatsApp enquiry created with full details"
+        status_type = "success"
+    else:
+        status_message = "⚠️ PARTIAL SUCCESS: Enquiry created but sender name not available (Free GreenAPI plan limitation)"
+        status_type = "warning"
+    
+    enquiry_id = str(enquiry['_id'])
+    
+    # Serialize the enquiry for socket emission
+    socket_data = {
+        '_id': enquiry_id,
+        'wati_name': enquiry['wati_name'],
+        'user_name': enquiry['user_name'],
+        'mobile_number': enquiry['mobile_number'],
+        'comments': enquiry['comments'],
+        'staff': enquiry['staff'],
+        'source': enquiry['source'],
+        'whatsapp_sender_name': enquiry['whatsapp_sender_name'],
+        'created_at': enquiry['created_at'].isoformat(),
+        'date': enquiry['date'].isoformat()
     }
     
-    return responses.get(text_lower, "I didn't understand that. Please reply with one of these options: Get Loan, Check Eligibility, or More Details")
+    # Status notification for the webhook monitor
+    status_notification = {
+        **_STATUS_NOTIF_BASE,
+        'status': status_type,
+        'message': status_message,
+        'details': {
+            **_STATUS_DETAILS_BASE,
+            'mobile_number': clean_number,
+            'sender_name_available': sender_name_valid,
+            'enquiry_id': enquiry_id
+        },
+        'timestamp': timestamp
+    }
+    return socket_data, status_notification
 
-def _process_incoming_message(data):
-    """Process incoming message data"""
+def _notify_new_enquiry(enquiry, clean_number, sender_name_valid, timestamp):
+    """Announce a persisted WhatsApp enquiry to connected dashboards"""
+    # Skip the serialization entirely when no dashboard is connected
+    if not _has_listeners():
+        return
+    
     try:
-        message_data = data['message']
-        chat_id = data['chatId']
+        socket_data, status_notification = _build_enquiry_notification(enquiry, clean_number, sender_name_valid, timestamp)
+        _announce_enquiry(socket_data, status_notification)
+        logger.debug("📡 Socket events emitted for new WhatsApp enquiry with status: %s", status_notification['status'])
         
-        # Extract sender information
-        sender_number = chat_id.replace('@c.us', '')  # Remove @c.us suffix
-        message_text = message_data.get('textMessage', {}).get('text', '')
+    except Exception as socket_error:
+        logger.error(f"❌ Error emitting socket event: {socket_error}")
         
-        # Check if this is one of our reply options
-        if _is_reply_option(message_text):
-            logger.info(f"🔄 Processing reply option from {data.get('senderName', '') or chat_id}: {message_text}")
-            # Send appropriate response
-            response_text = _get_reply_response(message_text)
-            if whatsapp_service and whatsapp_service.api_available:
-                # Format the phone number properly for GreenAPI
-                formatted_number = chat_id  # chat_id already includes @c.us suffix
-                result = whatsapp_service.send_message(formatted_number, response_text)
-                if result['success']:
-                    logger.info(f"✅ Reply sent for option '{message_text}' to {chat_id}")
+        # Even if socket fails, emit a basic notification
+        try:
+            error_notification = {
+                'type': 'webhook_status',
+                'status': 'error',
+                'message': f"❌ ERROR: Enquiry created but notification failed: {str(socket_error)}",
+                'details': {
+                    'mobile_number': clean_number,
+                    'enquiry_created': True,
+                    'notification_error': str(socket_error)
+                },
+                'timestamp': timestamp
+            }
+            _get_socketio().emit('webhook_notification', error_notification)
+        except:
+            pass  # If even this fails, just log it
+
+# Webhook enquiry inserts are funnelled through one worker thread that drains
+# whatever has queued up while the previous write was in flight, so bursts
+# (e.g. a campaign landing) become a single insert_many instead of one
+# round-trip per message. With no backlog the batch is just the one document.
+# The bounded queue gives backpressure (503) instead of unbounded memory.
+_write_queue = queue.Queue(maxsize=10000)
+_WRITE_BATCH_MAX = 100
+# A batch that fails outright (network blip, primary election) is retried
+# with exponential backoff (base delay in seconds) before it is given up on
+_WRITE_MAX_ATTEMPTS = 4
+_WRITE_BACKOFF_BASE = 0.5
+# Seconds a webhook request waits for its insert; well inside gunicorn's 30s
+_INSERT_WAIT_TIMEOUT = 10
+
+def _drain_queue(work_queue, max_items):
+    """Block for one item, then take whatever else has queued up, up to max_items"""
+    batch = [work_queue.get()]
+    while len(batch) < max_items:
+        try:
+            batch.append(work_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def _write_enquiry_batch(docs, max_attempts=1):
+    """Write docs with one unordered insert_many, returning {index: error} for those not written"""
+    for attempt in range(max_attempts):
+        try:
+            webhook_enquiries_collection.insert_many(docs, ordered=False, bypass_document_validation=True)
+            return {}
+        except BulkWriteError as bulk_error:
+            failed = {}
+            for write_error in bulk_error.details.get('writeErrors', []):
+                if write_error.get('code') == 11000:
+                    # A duplicate _id on a retry means an earlier attempt
+                    # wrote the document before failing, so it is persisted
+                    if attempt and '_id' in write_error.get('keyPattern', {}):
+                        continue
+                    error = DuplicateKeyError(write_error.get('errmsg', ''), 11000, write_error)
                 else:
-                    logger.error(f"❌ Failed to send reply for option '{message_text}' to {chat_id}: {result.get('error')}")
-            return jsonify({
-                'success': True,
-                'message': 'Reply option processed'
-            }), 200
-        # Check if this is the "I am interested" message
-        elif _is_interested_message(message_text):
-            return _create_enquiry_from_message(chat_id, message_text, data.get('senderName', ''), message_data.get('idMessage', ''))
+                    error = BulkWriteError({'writeErrors': [write_error]})
+                failed[write_error['index']] = error
+            return failed
+        except Exception as insert_error:
+            if attempt + 1 < max_attempts:
+                delay = _WRITE_BACKOFF_BASE * 2 ** attempt
+                logger.warning(f"⚠️ Failed to write {len(docs)} WhatsApp enquiries, retrying in {delay}s: {insert_error}")
+                time.sleep(delay)
+            else:
+                logger.exception(
+                    "❌ Failed to write %d WhatsApp enquiries after %d attempt(s): ids=%s",
+                    len(docs), max_attempts, [str(doc.get('_id')) for doc in docs]
+                )
+                return dict.fromkeys(range(len(docs)), insert_error)
+
+def _write_worker():
+    """Drain _write_queue in batches and report each enquiry's outcome to its callback"""
+    while True:
+        batch = _drain_queue(_write_queue, _WRITE_BATCH_MAX)
+        failed = _write_enquiry_batch([doc for doc, _ in batch], _WRITE_MAX_ATTEMPTS)
+        
+        duplicates = 0
+        for index, error in failed.items():
+            if isinstance(error, DuplicateKeyError):
+                duplicates += 1
+            elif isinstance(error, BulkWriteError):
+                logger.error(f"❌ Failed to persist WhatsApp enquiry {batch[index][0].get('_id')}: {error}")
+        if duplicates:
+            logger.info(f"📝 Skipped {duplicates} duplicate WhatsApp enquiries")
+        
+        if len(batch) > 1:
+            logger.info(f"📦 Batched {len(batch)} WhatsApp enquiry inserts")
+        for index, (doc, on_written) in enumerate(batch):
+            try:
+                on_written(doc, failed.get(index))
+            except Exception:
+                logger.exception("❌ Error handling written WhatsApp enquiry %s", doc.get('_id'))
+
+def _queue_enquiry_write(doc, on_written):
+    """Queue doc for the write worker; on_written(doc, error) runs once it is written or rejected.
+
+    Raises queue.Full when the backlog is at capacity.
+    """
+    _ensure_worker(_write_worker)
+    _write_queue.put_nowait((doc, on_written))
+
+def _insert_enquiry(doc):
+    """Queue an enquiry for the batched write worker and wait for its ObjectId.
+
+    Raises queue.Full when the backlog is at capacity and
+    concurrent.futures.TimeoutError when the write takes too long.
+    """
+    future = concurrent.futures.Future()
+    
+    def _resolve(written_doc, error):
+        if error is None:
+            future.set_result(written_doc['_id'])
         else:
-            logger.info(f"📥 Received WhatsApp message but not 'interested' message: {message_text}")
-            return jsonify({
-                'success': True,
-                'message': 'Message received but not processed as enquiry'
-            }), 200
-            
-    except Exception as e:
-        logger.error(f"❌ Error processing message data: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': f'Error processing message: {str(e)}'
-        }), 500
+            future.set_exception(error)
+    
+    _queue_enquiry_write(doc, _resolve)
+    return future.result(timeout=_INSERT_WAIT_TIMEOUT)
+
+# Fields every enquiry document starts with; callers override what they know
+_ENQUIRY_TEMPLATE = {
+    'gst': '',
+    'business_type': '',
+    'business_nature': '',
+    'staff': '',
+    'comments': 'New Enquiry - Interested',
+    'additional_comments': ''
+}
+
+def _build_enquiry_doc(now, **overrides):
+    """Build a new enquiry document stamped with now"""
+    return {**_ENQUIRY_TEMPLATE, 'date': now, 'created_at': now, 'updated_at': now, **overrides}
 
 def _create_enquiry_from_message(chat_id, message_text, sender_name, message_id):
     """Create enquiry record from message data"""
     try:
+        now = datetime.utcnow()
+        now_iso = now.isoformat()
+        
         # Extract sender information
         sender_number = chat_id.replace('@c.us', '')  # Remove @c.us suffix
         
         # Clean and format mobile number
         # Remove any non-digit characters and ensure proper format
-        clean_number = ''.join(filter(str.isdigit, sender_number))
+        clean_number = sender_number.translate(_NON_DIGIT_TABLE)
         
         # Log the extracted information for debugging
-        logger.info(f"📋 Creating enquiry from WhatsApp message:")
-        logger.info(f"   Original Chat ID: {chat_id}")
-        logger.info(f"   Extracted Number: {sender_number}")
-        logger.info(f"   Clean Number: {clean_number}")
-        logger.info(f"   Sender Name: {sender_name}")
-        logger.info(f"   Message: {message_text}")
+        logger.debug("📋 Creating enquiry from WhatsApp message:")
+        logger.debug("   Original Chat ID: %s", chat_id)
+        logger.debug("   Extracted Number: %s", sender_number)
+        logger.debug("   Clean Number: %s", clean_number)
+        logger.debug("   Sender Name: %s", sender_name)
+        logger.debug("   Message: %s", message_text)
         
         # Determine the display name for the enquiry
-        # Handle GreenAPI free version limitations
-        if sender_name and sender_name.strip() and sender_name.strip() != 'null' and sender_name.strip() != '':
-            display_name = sender_name.strip()
-            logger.info(f"   Using sender name: {display_name}")
+        # Handle GreenAPI free version limitations ('null' or blank names)
+        stripped_name = (sender_name or '').strip()
+        sender_name_valid = bool(stripped_name) and stripped_name != 'null'
+        if sender_name_valid:
+            display_name = stripped_name
+            logger.debug("   Using sender name: %s", display_name)
         else:
             # For free plans, use phone number as identifier
             display_name = f"WhatsApp User {clean_number}"
-            logger.info(f"   Using phone-based name (free plan): {display_name}")
-            logger.info(f"   Note: Sender name not available in free GreenAPI plan")
+            logger.debug("   Using phone-based name (free plan): %s", display_name)
+            logger.debug("   Note: Sender name not available in free GreenAPI plan")
         
         # Create a new enquiry record with proper WhatsApp fields
-        new_enquiry = {
-            'date': datetime.utcnow(),
-            'wati_name': display_name,
-            'user_name': sender_name if sender_name and sender_name.strip() and sender_name.strip() != 'null' else '',  # Store actual WhatsApp username (may be empty in free plan)
-            'mobile_number': clean_number,
-            'secondary_mobile_number': None,
-            'gst': '',
-            'gst_status': '',
-            'business_type': '',
-            'business_nature': '',
-            'staff': 'WhatsApp Bot',  # Default staff assignment
-            'comments': 'New Enquiry - Interested',
-            'additional_comments': f'Received via WhatsApp: "{message_text}"',
+        new_enquiry = _build_enquiry_doc(
+            now,
+            wati_name=display_name,
+            user_name=sender_name if sender_name_valid else '',  # Store actual WhatsApp username (may be empty in free plan)
+            mobile_number=clean_number,
+            secondary_mobile_number=None,
+            gst_status='',
+            staff='WhatsApp Bot',  # Default staff assignment
+            additional_comments=f'Received via WhatsApp: "{message_text}"',
             # WhatsApp specific fields
-            'whatsapp_status': 'received',
-            'whatsapp_message_id': message_id,
-            'whatsapp_chat_id': chat_id,
-            'whatsapp_sender_name': sender_name if sender_name and sender_name.strip() and sender_name.strip() != 'null' else 'Not available (Free plan)',
-            'whatsapp_message_text': message_text,
-            'whatsapp_sent': False,  # No message sent yet, just received
-            'source': 'whatsapp_webhook',
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
+            whatsapp_status='received',
+            whatsapp_message_id=message_id,
+            whatsapp_chat_id=chat_id,
+            whatsapp_sender_name=sender_name if sender_name_valid else 'Not available (Free plan)',
+            whatsapp_message_text=message_text,
+            whatsapp_sent=False,  # No message sent yet, just received
+            source='whatsapp_webhook'
+        )
         
         # Insert into database
         if enquiries_collection is not None:
-            # Check if enquiry already exists for this mobile number and message ID to avoid duplicates
-            existing_enquiry = enquiries_collection.find_one({
-                'mobile_number': clean_number,
-                'whatsapp_message_id': message_id
-            })
-            
-            if existing_enquiry:
+            # Insert new enquiry (batched with any concurrent webhook inserts).
+            # GreenAPI retries deliver the same message ID again; the unique
+            # index on whatsapp_message_id rejects those instead of a prior lookup
+            try:
+                new_enquiry['_id'] = str(_insert_enquiry(new_enquiry))
+            except DuplicateKeyError:
+                existing_enquiry = enquiries_collection.find_one(
+                    {'whatsapp_message_id': message_id},
+                    {'_id': 1},
+                    hint=[('whatsapp_message_id', 1)]
+                )
                 logger.info(f"📝 Enquiry already exists for message ID {message_id}, skipping creation")
                 return jsonify({
                     'success': True,
                     'message': 'Enquiry already exists',
-                    'enquiry_id': str(existing_enquiry['_id'])
+                    'enquiry_id': str(existing_enquiry['_id']) if existing_enquiry else None
                 }), 200
+            except queue.Full:
+                logger.warning("⚠️ Enquiry write queue full, rejecting webhook from %s", chat_id)
+                return jsonify({
+                    'success': False,
+                    'error': 'Server busy, please retry'
+                }), 503
+            except concurrent.futures.TimeoutError:
+                # Treated as failed; if the write still lands, GreenAPI's retry
+                # is answered by the duplicate branch above
+                logger.error("❌ Timed out waiting for enquiry insert from %s", chat_id)
+                return jsonify({
+                    'success': False,
+                    'error': 'Enquiry insert timed out, please retry'
+                }), 503
             
-            # Insert new enquiry
-            result = enquiries_collection.insert_one(new_enquiry)
-            new_enquiry['_id'] = str(result.inserted_id)
-            
-            logger.info(f"✅ New WhatsApp enquiry created successfully:")
-            logger.info(f"   Enquiry ID: {new_enquiry['_id']}")
-            logger.info(f"   Customer: {display_name}")
-            logger.info(f"   Mobile: {clean_number}")
-            logger.info(f"   WhatsApp Name: {sender_name}")
+            logger.info("✅ New WhatsApp enquiry created: id=%s customer=%s mobile=%s", new_enquiry['_id'], display_name, clean_number)
+            logger.debug("   WhatsApp Name: %s", sender_name)
             
             # Emit socket event to notify frontend with comprehensive status
-            try:
-                from app import socketio
-                
-                # Determine the status message based on data availability
-                if sender_name and sender_name.strip() and sender_name.strip() != 'null':
-                    status_message = "✅ SUCCESS: WhatsApp enquiry created with full details"
-                    status_type = "success"
-                else:
-                    status_message = "⚠️ PARTIAL SUCCESS: Enquiry created but sender name not available (Free GreenAPI plan limitation)"
-                    status_type = "warning"
-                
-                # Serialize the enquiry for socket emission
-                socket_data = {
-                    '_id': new_enquiry['_id'],
-                    'wati_name': new_enquiry['wati_name'],
-                    'user_name': new_enquiry['user_name'],
-                    'mobile_number': new_enquiry['mobile_number'],
-                    'comments': new_enquiry['comments'],
-                    'staff': new_enquiry['staff'],
-                    'source': new_enquiry['source'],
-                    'whatsapp_sender_name': new_enquiry['whatsapp_sender_name'],
-                    'created_at': new_enquiry['created_at'].isoformat(),
-                    'date': new_enquiry['date'].isoformat()
-                }
-                
-                # Emit enquiry creation event
-                socketio.emit('new_enquiry', socket_data)
-                
-                # Emit status notification
-                status_notification = {
-                    'type': 'webhook_status',
-                    'status': status_type,
-                    'message': status_message,
-                    'details': {
-                        'mobile_number': clean_number,
-                        'sender_name_available': bool(sender_name and sender_name.strip() and sender_name.strip() != 'null'),
-                        'greenapi_plan': 'free',
-                        'whatsapp_account_type': 'normal',
-                        'enquiry_created': True,
-                        'enquiry_id': new_enquiry['_id']
-                    },
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                socketio.emit('webhook_notification', status_notification)
-                logger.info(f"📡 Socket events emitted for new WhatsApp enquiry with status: {status_type}")
-                
-            except Exception as socket_error:
-                logger.error(f"❌ Error emitting socket event: {socket_error}")
-                
-                # Even if socket fails, emit a basic notification
-                try:
-                    from app import socketio
-                    error_notification = {
-                        'type': 'webhook_status',
-                        'status': 'error',
-                        'message': f"❌ ERROR: Enquiry created but notification failed: {str(socket_error)}",
-                        'details': {
-                            'mobile_number': clean_number,
-                            'enquiry_created': True,
-                            'notification_error': str(socket_error)
-                        },
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
-                    socketio.emit('webhook_notification', error_notification)
-                except:
-                    pass  # If even this fails, just log it
+            _notify_new_enquiry(new_enquiry, clean_number, sender_name_valid, now_iso)
             
             return jsonify({
                 'success': True,
@@ -1949,15 +2148,14 @@ def _create_enquiry_from_message(chat_id, message_text, sender_name, message_id)
                 'error': 'Database not available'
             }), 500
     except Exception as e:
-        logger.error(f"Error in WhatsApp webhook: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in WhatsApp webhook: %s", e)
         return jsonify({'error': f'WhatsApp webhook failed: {str(e)}'}), 500
 
 @enquiry_bp.route('/whatsapp/public-send', methods=['POST'])
 def public_send_whatsapp():
     """Send WhatsApp message for public users without authentication"""
     try:
+        now = datetime.utcnow()
         data = request.get_json()
         
         if not data or 'mobile_number' not in data:
@@ -1983,20 +2181,7 @@ def public_send_whatsapp():
             logger.info("WhatsApp service not available, creating enquiry record only")
             
             # Create a new enquiry record
-            new_enquiry = {
-                'date': datetime.utcnow(),
-                'wati_name': wati_name,
-                'mobile_number': mobile_number,
-                'gst': '',
-                'business_type': '',
-                'business_nature': '',
-                'staff': '',
-                'comments': 'New Enquiry - Interested',
-                'additional_comments': '',
-                'whatsapp_status': 'pending',
-                'created_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow()
-            }
+            new_enquiry = _build_enquiry_doc(now, wati_name=wati_name, mobile_number=mobile_number, whatsapp_status='pending')
             
             # Insert into database
             if enquiries_collection is not None:
@@ -2007,8 +2192,8 @@ def public_send_whatsapp():
                 
                 # Emit socket event to notify frontend
                 try:
-                    from app import socketio
-                    socketio.emit('new_enquiry', new_enquiry)
+                    socketio = _get_socketio()
+                    socketio.emit('new_enquiry', new_enquiry, room=STAFF_ENQUIRIES_ROOM)
                 except Exception as socket_error:
                     logger.error(f"❌ Error emitting socket event: {socket_error}")
                 
@@ -2033,20 +2218,7 @@ def public_send_whatsapp():
                 logger.info(f"✅ Message sent to {mobile_number}")
                 
                 # Create a new enquiry record
-                new_enquiry = {
-                    'date': datetime.utcnow(),
-                    'wati_name': wati_name,
-                    'mobile_number': mobile_number,
-                    'gst': '',
-                    'business_type': '',
-                    'business_nature': '',
-                    'staff': '',
-                    'comments': 'New Enquiry - Interested',
-                    'additional_comments': '',
-                    'whatsapp_status': 'sent',
-                    'created_at': datetime.utcnow(),
-                    'updated_at': datetime.utcnow()
-                }
+                new_enquiry = _build_enquiry_doc(now, wati_name=wati_name, mobile_number=mobile_number, whatsapp_status='sent')
                 
                 # Insert into database
                 if enquiries_collection is not None:
@@ -2057,8 +2229,8 @@ def public_send_whatsapp():
                     
                     # Emit socket event to notify frontend
                     try:
-                        from app import socketio
-                        socketio.emit('new_enquiry', new_enquiry)
+                        socketio = _get_socketio()
+                        socketio.emit('new_enquiry', new_enquiry, room=STAFF_ENQUIRIES_ROOM)
                     except Exception as socket_error:
                         logger.error(f"❌ Error emitting socket event: {socket_error}")
                     
@@ -2087,12 +2259,31 @@ def public_send_whatsapp():
             'error': f'Error sending message: {str(e)}'
         }), 500
 
+# Enquiries from whatsapp_webhook are persisted and announced off the request
+# thread through the shared write worker
+def _on_enquiry_persisted(sender_name, clean_number):
+    """Callback for the write worker that announces a webhook enquiry once written"""
+    def on_written(enquiry_data, error):
+        if error is None:
+            _notify_persisted(enquiry_data, sender_name, clean_number)
+    return on_written
+
+def _notify_persisted(enquiry_data, sender_name, clean_number):
+    """Emit the frontend notifications for a persisted webhook enquiry"""
+    logger.info("✅ New WhatsApp enquiry created: id=%s mobile=%s", enquiry_data['_id'], clean_number)
+    
+    stripped_name = (sender_name or '').strip()
+    sender_name_valid = bool(stripped_name) and stripped_name != 'null'
+    _notify_new_enquiry(enquiry_data, clean_number, sender_name_valid, datetime.utcnow().isoformat())
+
 @enquiry_bp.route('/whatsapp/webhook', methods=['POST'])
 def whatsapp_webhook():
     """Handle incoming WhatsApp messages"""
     try:
+        now = datetime.utcnow()
+        now_iso = now.isoformat()
         data = request.get_json()
-        logger.info(f"Received WhatsApp webhook data: {data}")
+        logger.debug("Received WhatsApp webhook data: %s", data)
         
         if not data or 'message' not in data:
             return jsonify({'error': 'Invalid webhook data'}), 400
@@ -2103,20 +2294,22 @@ def whatsapp_webhook():
         sender_name = data.get('senderName', '')
         display_name = sender_name or chat_id
         
+        normalized_text = message_text.strip().lower()
+        
         # Check if this is one of our reply options
-        if _is_reply_option(message_text):
-            logger.info(f"🔄 Processing reply option from {data.get('senderName', '') or chat_id}: {message_text}")
+        if _is_reply_option(normalized_text):
+            logger.info("🔄 Processing reply option from %s: %s", display_name, message_text)
             # Send appropriate response
-            response_text = _get_reply_response(message_text)
+            response_text = _get_reply_response(normalized_text)
             if whatsapp_service and whatsapp_service.api_available:
                 # Use the proper method to send the message
-                logger.info(f"📤 Sending reply message: {response_text}")
+                logger.debug("📤 Sending reply message: %s", response_text)
                 result = whatsapp_service.send_message(chat_id, response_text)
                 if result['success']:
-                    logger.info(f"✅ Reply sent for option '{message_text}' to {chat_id}")
+                    logger.info("✅ Reply sent for option '%s' to %s", message_text, chat_id)
                     # Emit success notification
                     try:
-                        from app import socketio
+                        socketio = _get_socketio()
                         notification = {
                             'type': 'webhook_status',
                             'status': 'success',
@@ -2127,7 +2320,7 @@ def whatsapp_webhook():
                                 'recipient': chat_id,
                                 'message_id': result.get('message_id', 'unknown')
                             },
-                            'timestamp': datetime.utcnow().isoformat()
+                            'timestamp': now_iso
                         }
                         socketio.emit('webhook_notification', notification)
                     except Exception as socket_error:
@@ -2139,7 +2332,7 @@ def whatsapp_webhook():
                     
                     # Emit error notification
                     try:
-                        from app import socketio
+                        socketio = _get_socketio()
                         notification = {
                             'type': 'webhook_status',
                             'status': 'error',
@@ -2150,7 +2343,7 @@ def whatsapp_webhook():
                                 'recipient': chat_id,
                                 'error': result.get('error', 'Unknown error')
                             },
-                            'timestamp': datetime.utcnow().isoformat()
+                            'timestamp': now_iso
                         }
                         socketio.emit('webhook_notification', notification)
                     except Exception as socket_error:
@@ -2168,7 +2361,7 @@ def whatsapp_webhook():
                 logger.error("❌ WhatsApp service not available")
                 # Emit service unavailable notification
                 try:
-                    from app import socketio
+                    socketio = _get_socketio()
                     notification = {
                         'type': 'webhook_status',
                         'status': 'error',
@@ -2179,7 +2372,7 @@ def whatsapp_webhook():
                             'recipient': chat_id,
                             'error': 'Service not available'
                         },
-                        'timestamp': datetime.utcnow().isoformat()
+                        'timestamp': now_iso
                     }
                     socketio.emit('webhook_notification', notification)
                 except Exception as socket_error:
@@ -2190,7 +2383,9 @@ def whatsapp_webhook():
             }), 200
         
         # Create enquiry data
+        clean_number = chat_id.replace('@c.us', '').translate(_NON_DIGIT_TABLE)
         enquiry_data = {
+            '_id': ObjectId(),  # assigned up front so the id can be returned before the insert runs
             'wati_name': sender_name,
             'user_name': sender_name,
             'mobile_number': chat_id,
@@ -2198,169 +2393,38 @@ def whatsapp_webhook():
             'staff': '',
             'source': 'WhatsApp',
             'whatsapp_sender_name': sender_name,
-            'created_at': datetime.utcnow(),
-            'date': datetime.utcnow()
+            'created_at': now,
+            'date': now
         }
         
         # Check if database is available
-        if enquiries_collection is not None:
-            try:
-                # Insert into database
-                result = enquiries_collection.insert_one(enquiry_data)
-                new_enquiry = result.inserted_id
-                
-                logger.info(f"✅ New WhatsApp enquiry created: {new_enquiry}")
-                
-                # Emit socket event to notify frontend
-                try:
-                    from app import socketio
-                    socketio.emit('new_enquiry', enquiry_data)
-                except Exception as socket_error:
-                    logger.error(f"❌ Error emitting socket event: {socket_error}")
-                
-                # Determine the status message based on data availability
-                if sender_name and sender_name.strip() and sender_name.strip() != 'null':
-                    status_message = "✅ SUCCESS: WhatsApp enquiry created with full details"
-                    status_type = "success"
-                else:
-                    status_message = "⚠️ PARTIAL SUCCESS: Enquiry created but sender name not available (Free GreenAPI plan limitation)"
-                    status_type = "warning"
-                
-                # Serialize the enquiry for socket emission
-                socket_data = {
-                    '_id': new_enquiry['_id'],
-                    'wati_name': new_enquiry['wati_name'],
-                    'user_name': new_enquiry['user_name'],
-                    'mobile_number': new_enquiry['mobile_number'],
-                    'comments': new_enquiry['comments'],
-                    'staff': new_enquiry['staff'],
-                    'source': new_enquiry['source'],
-                    'whatsapp_sender_name': new_enquiry['whatsapp_sender_name'],
-                    'created_at': new_enquiry['created_at'].isoformat(),
-                    'date': new_enquiry['date'].isoformat()
-                }
-                
-                # Emit enquiry creation event
-                socketio.emit('new_enquiry', socket_data)
-                
-                # Emit status notification
-                status_notification = {
-                    'type': 'webhook_status',
-                    'status': status_type,
-                    'message': status_message,
-                    'details': {
-                        'mobile_number': clean_number,
-                        'sender_name_available': bool(sender_name and sender_name.strip() and sender_name.strip() != 'null'),
-                        'greenapi_plan': 'free',
-                        'whatsapp_account_type': 'normal',
-                        'enquiry_created': True,
-                        'enquiry_id': new_enquiry['_id']
-                    },
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                socketio.emit('webhook_notification', status_notification)
-                logger.info(f"📡 Socket events emitted for new WhatsApp enquiry with status: {status_type}")
-                
-            except Exception as socket_error:
-                logger.error(f"❌ Error emitting socket event: {socket_error}")
-                
-                # Even if socket fails, emit a basic notification
-                try:
-                    from app import socketio
-                    error_notification = {
-                        'type': 'webhook_status',
-                        'status': 'error',
-                        'message': f"❌ ERROR: Enquiry created but notification failed: {str(socket_error)}",
-                        'details': {
-                            'mobile_number': clean_number,
-                            'enquiry_created': True,
-                            'notification_error': str(socket_error)
-                        },
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
-                    socketio.emit('webhook_notification', error_notification)
-                except:
-                    pass  # If even this fails, just log it
-            
-            return jsonify({
-                'success': True,
-                'message': 'WhatsApp enquiry created successfully',
-                'enquiry_id': new_enquiry['_id'],
-                'customer_name': display_name,
-                'mobile_number': clean_number,
-                'whatsapp_name': sender_name
-            }), 200
-        else:
+        if enquiries_collection is None:
             logger.error("❌ Database not available for enquiry creation")
             return jsonify({
                 'success': False,
                 'error': 'Database not available'
             }), 500
-
-    # If service is available, send the message
-    result = whatsapp_service.send_enquiry_message(enquiry_data, message_type)
-
-    logger.info(f"Public WhatsApp send result: {result}")
-
-    # Create a new enquiry record regardless of WhatsApp send result
-    new_enquiry = {
-        'date': datetime.utcnow(),
-        'wati_name': wati_name,
-        'mobile_number': mobile_number,
-        'gst': '',
-        'business_type': '',
-        'business_nature': '',
-        'staff': '',
-        'comments': 'New Enquiry - Interested',
-        'additional_comments': '',
-        'whatsapp_status': 'sent' if result['success'] else 'failed',
-        'whatsapp_message_id': result.get('message_id', ''),
-        'whatsapp_error': result.get('error', '') if not result['success'] else '',
-        'created_at': datetime.utcnow(),
-        'updated_at': datetime.utcnow()
-    }
-
-    # Insert into database
-    if enquiries_collection is not None:
-        db_result = enquiries_collection.insert_one(new_enquiry)
-        new_enquiry['_id'] = str(db_result.inserted_id)
-
-        logger.info(f"✅ New public enquiry created: {new_enquiry['_id']}")
-
-        # Emit socket event to notify frontend
+        
+        # Hand the insert and socket fan-out to the write worker so GreenAPI
+        # gets its response straight away; shed load once the queue is full
         try:
-            from app import socketio
-            socketio.emit('new_enquiry', new_enquiry)
-        except Exception as socket_error:
-            logger.error(f"❌ Error emitting socket event: {socket_error}")
-    else:
-        logger.error("❌ Database not available for enquiry creation")
-
-    if result['success']:
-        return jsonify({
-            'success': True,
-            'message': 'WhatsApp message sent and enquiry created successfully',
-            'message_id': result.get('message_id'),
-            'enquiry_id': new_enquiry['_id'] if '_id' in new_enquiry else None,
-            'mobile_number': mobile_number,
-            'message_type': message_type,
-            'whatsapp_redirect': True
-        }), 200
-    else:
-        # Even if WhatsApp send failed, we still created the enquiry
+            _queue_enquiry_write(enquiry_data, _on_enquiry_persisted(sender_name, clean_number))
+        except queue.Full:
+            logger.warning(f"⚠️ Enquiry write queue full, rejecting webhook from {chat_id}")
+            return jsonify({
+                'success': False,
+                'error': 'Server busy, please retry'
+            }), 503
+        
         return jsonify({
             'success': True,
-            'message': 'Enquiry created successfully (WhatsApp message may have failed)',
-            'enquiry_id': new_enquiry['_id'] if '_id' in new_enquiry else None,
-            'mobile_number': mobile_number,
-            'message_type': message_type,
-            'whatsapp_error': result.get('error', ''),
-            'whatsapp_redirect': True
+            'message': 'WhatsApp enquiry accepted',
+            'enquiry_id': str(enquiry_data['_id']),
+            'customer_name': display_name,
+            'mobile_number': clean_number,
+            'whatsapp_name': sender_name
         }), 200
-
-except Exception as e:
-    logger.error(f"Error in public WhatsApp send: {str(e)}")
-    import traceback
-    logger.error(f"Traceback: {traceback.format_exc()}")
-    return jsonify({'error': f'Public WhatsApp send failed: {str(e)}'}), 500
+    
+    except Exception as e:
+        logger.exception("Error in WhatsApp webhook: %s", e)
+        return jsonify({'error': f'WhatsApp webhook failed: {str(e)}'}), 500
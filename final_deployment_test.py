@@ -6,6 +6,7 @@ Final deployment test to verify webhook functionality
 import os
 import sys
 import requests
+from requests.adapters import HTTPAdapter
 import time
 
 # Add the current directory to the path
@@ -74,10 +75,15 @@ def test_render_webhook():
         "senderName": "Test User"
     }
     
+    # One pooled connection so the OPTIONS and POST share a TLS session
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+    session.headers.update({"Content-Type": "application/json"})
+    
     try:
         # First check if the endpoint exists with OPTIONS request
         print("🔄 Testing endpoint accessibility...")
-        response = requests.options(
+        response = session.options(
             f"{base_url}/api/enquiries/whatsapp/webhook",
             timeout=30
         )
@@ -85,10 +91,9 @@ def test_render_webhook():
         
         # Then test the actual POST request
         print("🔄 Testing webhook functionality...")
-        response = requests.post(
+        response = session.post(
             f"{base_url}/api/enquiries/whatsapp/webhook",
             json=webhook_data,
-            headers={"Content-Type": "application/json"},
             timeout=30
         )
         
@@ -110,6 +115,8 @@ def test_render_webhook():
     except Exception as e:
         print(f"❌ Render webhook test failed: {e}")
         return False
+    finally:
+        session.close()
 
 def main():
     """Main test function"""
@@ -1,6 +1,4 @@
 # Script to fix all indentation errors in client_routes.py
-with open('client_routes.py', 'r', encoding='utf-8') as f:
-    lines = f.readlines()
 
 # Fix the indentation error at line 1829 (0-indexed as 1828)
 # The issue is that the block starting with "# Validate Cloudinary URL" is indented with 16 spaces instead of 8
@@ -9,12 +7,11 @@ with open('client_routes.py', 'r', encoding='utf-8') as f:
 start_fix_line = 1828  # Line with "# Validate Cloudinary URL"
 end_fix_line = 1950    # Approximate end of the problematic block
 
-for i in range(start_fix_line, min(end_fix_line, len(lines))):
-    if lines[i].startswith('                '):  # 16 spaces
-        lines[i] = lines[i][8:]  # Remove 8 spaces
+# Stream line by line in binary mode, writing the fixed content as we go
+with open('client_routes.py', 'rb') as fin, open('client_routes_fixed2.py', 'wb') as fout:
+    for i, line in enumerate(fin):
+        if start_fix_line <= i < end_fix_line and line.startswith(b'                '):  # 16 spaces
+            line = line[8:]  # Remove 8 spaces
+        fout.write(line)
 
-# Write the fixed content back
-with open('client_routes_fixed2.py', 'w', encoding='utf-8') as f:
-    f.writelines(lines)
-
-print("Fixed all indentation errors in client_routes.py")
\ No newline at end of file
+print("Fixed all indentation errors in client_routes.py")
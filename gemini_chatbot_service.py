@@ -1,12 +1,19 @@
 import os
-import json
+import re
 import logging
+import time
+import functools
+import threading
+import concurrent.futures
+import orjson
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Union
-from pymongo import MongoClient
+from typing import Dict, List, Any, Optional, Union, Iterator
+from db_pool import get_client
+from rate_limit import TokenBucket
 from bson import ObjectId
 from dotenv import load_dotenv
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
 
 # Load environment variables
 load_dotenv()
@@ -15,7 +22,145 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fields the chatbot prompt and lookups actually use; everything else
+# (notably the large documents map) is left on the server
+_CLIENT_SAMPLE_FIELDS = {
+    'user_name': 1, 'business_name': 1, 'business_pan': 1, 'mobile_number': 1,
+    'email': 1, 'status': 1, 'gst_status': 1, 'loan_status': 1,
+    'required_loan_amount': 1, 'bank_type': 1, 'created_at': 1
+}
+_CLIENT_LOOKUP_FIELDS = {**_CLIENT_SAMPLE_FIELDS, 'documents': 1}
+_ENQUIRY_SAMPLE_FIELDS = {
+    'date': 1, 'wati_name': 1, 'mobile_number': 1, 'staff': 1,
+    'comments': 1, 'business_type': 1, 'gst': 1, 'status': 1
+}
+
+# Static part of the Gemini prompt, rendered once per turn with .format
+_PROMPT_TEMPLATE = """You are an AI assistant for TMIS Business Guru, a business management system.
+You have access to detailed enquiry and client data from the system.
+
+SYSTEM ACCESS INSTRUCTIONS:
+- When asked about client details, you have FULL ACCESS to client information
+- When asked about enquiry details, you have FULL ACCESS to enquiry information
+- You can analyze any data related to clients or enquiries
+- You should provide comprehensive answers when asked about specific data
+
+{context}
+
+User Query: {query}
+
+Instructions:
+1. Provide accurate, detailed responses based on the data provided
+2. If asked about specific numbers or statistics, use the exact data from the context
+3. If asked about GST status or client details, provide comprehensive information
+4. If asked about enquiries, provide detailed insights from the enquiry data
+5. Be conversational but professional
+6. If you don't have specific data to answer a question, say so clearly
+7. Format your response in a clear, readable manner
+8. Use bullet points or numbered lists when appropriate
+9. When asked for analysis, provide detailed insights
+10. When asked for specific client or enquiry information, provide all relevant details
+
+Respond to the user's query now with full access to the requested information:
+""".format
+
+# The only ObjectId / datetime fields stored on client and enquiry documents
+# (created_by and friends hold string ids)
+_OBJECT_ID_FIELDS = ('_id',)
+_DATETIME_FIELDS = ('date', 'created_at', 'updated_at')
+
+# Prompt for queries that are about neither enquiries nor clients
+_SHORT_PROMPT_TEMPLATE = """You are an AI assistant for TMIS Business Guru, a business management system.
+User asked: {query}
+You have no specific data context for this question; answer generally, conversationally and professionally.
+""".format
+
+_ERROR_REPLY = "I apologize, but I encountered an error while processing your request. Please try again or contact support if the issue persists. Error: {}"
+
+# Gemini's per-minute quota: calls beyond it wait for a token rather than
+# surfacing 429s, and quota errors that still happen are retried with backoff
+_GEMINI_CALLS_PER_MINUTE = 20
+_GEMINI_MAX_ATTEMPTS = 5
+_GEMINI_MAX_BACKOFF = 30
+
+_gemini_bucket = TokenBucket(_GEMINI_CALLS_PER_MINUTE, _GEMINI_CALLS_PER_MINUTE / 60)
+
+# Runs the stats query alongside the recent-sample query when building a prompt
+_context_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='chatbot-ctx')
+
+# Prompts include at most this many groups per distribution; the stats
+# themselves stay complete for the /enquiry-stats and /client-stats routes
+_STAFF_STATS_LIMIT = 20
+_CLIENT_STATS_LIMIT = 50
+
+# Stats move on a minutes scale, so they are cached briefly rather than
+# re-aggregated on every chat turn. Write paths can call invalidate_stats().
+# On a miss, concurrent callers share one in-flight query (single-flight)
+# instead of each running the same aggregations.
+_STATS_CACHE_TTL = 60
+_stats_cache = {}
+_stats_inflight = {}
+_stats_inflight_lock = threading.Lock()
+
+def _cached_stats(method):
+    """Cache a stats method's result for _STATS_CACHE_TTL seconds"""
+    name = method.__name__
+    
+    @functools.wraps(method)
+    def wrapper(self):
+        entry = _stats_cache.get(name)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        
+        with _stats_inflight_lock:
+            future = _stats_inflight.get(name)
+            leader = future is None
+            if leader:
+                future = _stats_inflight[name] = concurrent.futures.Future()
+        if not leader:
+            return future.result()
+        
+        try:
+            stats = method(self)
+            if stats:  # an empty dict means the query failed; don't keep it
+                _stats_cache[name] = (time.monotonic() + _STATS_CACHE_TTL, stats)
+            future.set_result(stats)
+            return stats
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _stats_inflight_lock:
+                del _stats_inflight[name]
+    return wrapper
+
+# Client lookups repeat within a conversation as the user refines a question;
+# found clients are kept briefly, keyed by lookup kind, value and projection
+_LOOKUP_CACHE_TTL = 30
+_LOOKUP_CACHE_MAX = 512
+_lookup_cache = {}
+_lookup_cache_lock = threading.Lock()
+
+def _lookup_cache_get(key):
+    """Return a cached client lookup, or None if missing or expired"""
+    entry = _lookup_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def _lookup_cache_put(key, client):
+    """Cache a client lookup, evicting the oldest entry when full"""
+    with _lookup_cache_lock:
+        if len(_lookup_cache) >= _LOOKUP_CACHE_MAX:
+            _lookup_cache.pop(next(iter(_lookup_cache)))
+        _lookup_cache[key] = (time.monotonic() + _LOOKUP_CACHE_TTL, client)
+
 class GeminiChatbotService:
+    # Query classifiers: same substring matches as the old keyword lists,
+    # done in one case-insensitive scan instead of lower() + a pass per word
+    _ENQUIRY_RE = re.compile(r'enquir(?:y|ies)|inquir(?:y|ies)', re.IGNORECASE)
+    _CLIENT_RE = re.compile(r'client|customer|gst|pan', re.IGNORECASE)
+    
     def __init__(self):
         """Initialize Gemini AI chatbot service"""
         self.api_key = os.getenv('GEMINI_API_KEY')
@@ -27,44 +172,84 @@ class GeminiChatbotService:
         if not self.mongodb_uri:
             raise ValueError("MONGODB_URI not found in environment variables")
         
-        # Configure Gemini AI
-        genai.configure(api_key=self.api_key)
+        # Configure Gemini AI over gRPC: one persistent HTTP/2 channel is
+        # reused for every call instead of per-request REST connections
+        genai.configure(api_key=self.api_key, transport='grpc')
         # Use gemini-flash-latest as it's more reliable and supported
         self.model = genai.GenerativeModel('gemini-flash-latest')
         
-        # Initialize MongoDB connection
+        # Use the shared pool; pymongo connects lazily on the first query
         try:
-            self.client = MongoClient(self.mongodb_uri, serverSelectionTimeoutMS=5000)
-            self.client.admin.command('ping')
+            self.client = get_client()
             self.db = self.client.tmis_business_guru
             
             # Collections
-            self.clients_collection = self.db.clients
-            self.enquiries_collection = self.db.enquiries
+            self._clients_collection = self.db.clients
+            self._enquiries_collection = self.db.enquiries
             self.users_collection = self.db.users
             
+            # Indexes are created on first use, not here: the instance is
+            # built at import, before gunicorn forks the workers
+            self._indexes_requested = False
+            self._indexes_lock = threading.Lock()
+            
             logger.info("✅ Gemini Chatbot Service initialized successfully")
             
         except Exception as e:
             logger.error(f"❌ MongoDB connection failed: {e}")
             raise
     
+    @property
+    def clients_collection(self):
+        """The clients collection, with its indexes scheduled on first use"""
+        self._ensure_indexes()
+        return self._clients_collection
+    
+    @property
+    def enquiries_collection(self):
+        """The enquiries collection, with its indexes scheduled on first use"""
+        self._ensure_indexes()
+        return self._enquiries_collection
+    
+    def _ensure_indexes(self):
+        """Schedule index creation once per process, on the first query"""
+        if self._indexes_requested:
+            return
+        with self._indexes_lock:
+            if self._indexes_requested:
+                return
+            self._indexes_requested = True
+        # Off the request thread; create_index is a no-op for existing indexes
+        _context_executor.submit(self._create_indexes)
+    
+    def _create_indexes(self):
+        """Create the indexes behind the chatbot's lookups and sorts"""
+        try:
+            self._clients_collection.create_index([('created_at', -1)])
+            self._clients_collection.create_index([('mobile_number', 1)])
+            self._clients_collection.create_index([('business_pan', 1)])
+            self._clients_collection.create_index([('gst_number', 1)])
+            self._enquiries_collection.create_index([('date', -1), ('staff', 1)])
+        except Exception as e:
+            logger.warning(f"Chatbot index creation warning: {e}")
+    
     def serialize_document(self, doc: Dict) -> Dict:
         """Convert MongoDB document to JSON serializable format"""
         if doc:
-            if '_id' in doc and isinstance(doc['_id'], ObjectId):
-                doc['_id'] = str(doc['_id'])
+            for key in _OBJECT_ID_FIELDS:
+                value = doc.get(key)
+                if isinstance(value, ObjectId):
+                    doc[key] = str(value)
             
             # Convert datetime objects to ISO format
-            for key, value in doc.items():
+            for key in _DATETIME_FIELDS:
+                value = doc.get(key)
                 if isinstance(value, datetime):
                     doc[key] = value.isoformat()
-                elif isinstance(value, ObjectId):
-                    doc[key] = str(value)
         
         return doc
     
-    def get_enquiry_data(self, filters: Optional[Dict] = None) -> List[Dict]:
+    def get_enquiry_data(self, filters: Optional[Dict] = None, limit: int = 100) -> List[Dict]:
         """Fetch enquiry data from MongoDB"""
         try:
             query = {}
@@ -81,14 +266,21 @@ class GeminiChatbotService:
                 if 'mobile_number' in filters:
                     query['mobile_number'] = filters['mobile_number']
             
-            enquiries = list(self.enquiries_collection.find(query).sort('date', -1).limit(100))
-            return [self.serialize_document(enq) for enq in enquiries]
+            # _id is stringified server-side; datetimes are left for orjson
+            pipeline = [
+                {'$match': query},
+                {'$sort': {'date': -1}},
+                {'$limit': limit},
+                {'$project': _ENQUIRY_SAMPLE_FIELDS},
+                {'$addFields': {'_id': {'$toString': '$_id'}}}
+            ]
+            return list(self.enquiries_collection.aggregate(pipeline, batchSize=limit))
             
         except Exception as e:
             logger.error(f"Error fetching enquiry data: {e}")
             return []
     
-    def get_client_data(self, filters: Optional[Dict] = None) -> List[Dict]:
+    def get_client_data(self, filters: Optional[Dict] = None, limit: int = 100) -> List[Dict]:
         """Fetch client data from MongoDB"""
         try:
             query = {}
@@ -102,189 +294,227 @@ class GeminiChatbotService:
                 if 'loan_status' in filters:
                     query['loan_status'] = filters['loan_status']
             
-            clients = list(self.clients_collection.find(query).sort('created_at', -1).limit(100))
-            return [self.serialize_document(client) for client in clients]
+            pipeline = [
+                {'$match': query},
+                {'$sort': {'created_at': -1}},
+                {'$limit': limit},
+                {'$project': _CLIENT_SAMPLE_FIELDS},
+                {'$addFields': {'_id': {'$toString': '$_id'}}}
+            ]
+            return list(self.clients_collection.aggregate(pipeline, batchSize=limit))
             
         except Exception as e:
             logger.error(f"Error fetching client data: {e}")
             return []
     
-    def get_client_by_gst(self, gst_number: str) -> Optional[Dict]:
+    def get_client_by_gst(self, gst_number: str, projection: Optional[Dict] = None) -> Optional[Dict]:
         """Get client by GST number"""
+        # The match is case-insensitive and ignores surrounding whitespace,
+        # so ' 29abcd' and '29ABCD' share an entry
+        gst_number = gst_number.strip()
+        cache_key = ('gst', gst_number.upper(), tuple(projection) if projection else None)
+        cached = _lookup_cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
+            # Substring match, so a PAN also finds the GSTIN that embeds it.
+            # The value is escaped so it is matched literally, not as a pattern
+            pattern = re.escape(gst_number)
             client = self.clients_collection.find_one({
                 '$or': [
-                    {'business_pan': {'$regex': gst_number, '$options': 'i'}},
-                    {'gst_number': {'$regex': gst_number, '$options': 'i'}}
+                    {'business_pan': {'$regex': pattern, '$options': 'i'}},
+                    {'gst_number': {'$regex': pattern, '$options': 'i'}}
                 ]
-            })
+            }, projection)
             
             if client:
-                return self.serialize_document(client)
+                client = self.serialize_document(client)
+                _lookup_cache_put(cache_key, client)
+                return client
             return None
             
         except Exception as e:
             logger.error(f"Error fetching client by GST: {e}")
             return None
     
-    def get_client_by_mobile(self, mobile_number: str) -> Optional[Dict]:
+    def get_client_by_mobile(self, mobile_number: str, projection: Optional[Dict] = None) -> Optional[Dict]:
         """Get client by mobile number"""
+        cache_key = ('mobile', mobile_number, tuple(projection) if projection else None)
+        cached = _lookup_cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             client = self.clients_collection.find_one({
                 'mobile_number': mobile_number
-            })
+            }, projection)
             
             if client:
-                return self.serialize_document(client)
+                client = self.serialize_document(client)
+                _lookup_cache_put(cache_key, client)
+                return client
             return None
             
         except Exception as e:
             logger.error(f"Error fetching client by mobile: {e}")
             return None
     
+    def invalidate_stats(self):
+        """Drop cached enquiry/client stats after a write"""
+        _stats_cache.clear()
+    
+    @_cached_stats
     def get_enquiry_stats(self) -> Dict:
         """Get enquiry statistics"""
         try:
-            total_enquiries = self.enquiries_collection.count_documents({})
+            total_enquiries = self.enquiries_collection.estimated_document_count()
             
-            # Get enquiries by date (last 30 days)
             from datetime import timedelta
             thirty_days_ago = datetime.now() - timedelta(days=30)
-            recent_enquiries = self.enquiries_collection.count_documents({
-                'date': {'$gte': thirty_days_ago}
-            })
             
-            # Get enquiries by staff
-            staff_pipeline = [
-                {'$group': {'_id': '$staff', 'count': {'$sum': 1}}},
-                {'$sort': {'count': -1}}
-            ]
-            staff_stats = list(self.enquiries_collection.aggregate(staff_pipeline))
+            # Recent count and per-staff breakdown in one pass over the collection
+            facets = next(self.enquiries_collection.aggregate([{'$facet': {
+                # Get enquiries by date (last 30 days)
+                'recent': [
+                    {'$match': {'date': {'$gte': thirty_days_ago}}},
+                    {'$count': 'count'}
+                ],
+                # Get enquiries by staff
+                'staff_stats': [
+                    {'$group': {'_id': '$staff', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}}
+                ]
+            }}], allowDiskUse=False))
             
             return {
                 'total_enquiries': total_enquiries,
-                'recent_enquiries': recent_enquiries,
-                'staff_stats': staff_stats
+                'recent_enquiries': facets['recent'][0]['count'] if facets['recent'] else 0,
+                'staff_stats': facets['staff_stats']
             }
             
         except Exception as e:
             logger.error(f"Error getting enquiry stats: {e}")
             return {}
     
+    @_cached_stats
     def get_client_stats(self) -> Dict:
         """Get client statistics"""
         try:
-            total_clients = self.clients_collection.count_documents({})
-            
-            # Get clients by status
-            status_pipeline = [
-                {'$group': {'_id': '$status', 'count': {'$sum': 1}}},
-                {'$sort': {'count': -1}}
-            ]
-            status_stats = list(self.clients_collection.aggregate(status_pipeline))
-            
-            # Get clients by loan status
-            loan_status_pipeline = [
-                {'$group': {'_id': '$loan_status', 'count': {'$sum': 1}}},
-                {'$sort': {'count': -1}}
-            ]
-            loan_stats = list(self.clients_collection.aggregate(loan_status_pipeline))
-            
-            # Get GST status distribution
-            gst_pipeline = [
-                {'$group': {'_id': '$gst_status', 'count': {'$sum': 1}}},
-                {'$sort': {'count': -1}}
-            ]
-            gst_stats = list(self.clients_collection.aggregate(gst_pipeline))
+            total_clients = self.clients_collection.estimated_document_count()
+            
+            # All three distributions in one pass over the collection
+            facets = next(self.clients_collection.aggregate([{'$facet': {
+                # Get clients by status
+                'status_stats': [
+                    {'$group': {'_id': '$status', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}}
+                ],
+                # Get clients by loan status
+                'loan_stats': [
+                    {'$group': {'_id': '$loan_status', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}}
+                ],
+                # Get GST status distribution
+                'gst_stats': [
+                    {'$group': {'_id': '$gst_status', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}}
+                ]
+            }}], allowDiskUse=False))
             
             return {
                 'total_clients': total_clients,
-                'status_stats': status_stats,
-                'loan_stats': loan_stats,
-                'gst_stats': gst_stats
+                'status_stats': facets['status_stats'],
+                'loan_stats': facets['loan_stats'],
+                'gst_stats': facets['gst_stats']
             }
             
         except Exception as e:
             logger.error(f"Error getting client stats: {e}")
             return {}
     
-    def generate_response(self, user_query: str, context_type: Optional[str] = None) -> str:
-        """Generate AI response using Gemini"""
-        try:
-            # Prepare context based on query type
-            context_data = ""
-            
-            # Determine if user is asking about enquiries or clients
-            is_enquiry_query = any(word in user_query.lower() for word in ['enquiry', 'enquiries', 'inquiry', 'inquiries'])
-            is_client_query = any(word in user_query.lower() for word in ['client', 'clients', 'customer', 'customers', 'gst', 'pan'])
-            
-            # Get relevant data based on context
-            if is_enquiry_query or context_type == "enquiry":
-                enquiry_stats = self.get_enquiry_stats()
-                recent_enquiries = self.get_enquiry_data()[:10]  # Get last 10 enquiries for more detail
-                
-                context_data = f"""
-                ENQUIRY DATA CONTEXT:
-                - Total Enquiries: {enquiry_stats.get('total_enquiries', 0)}
-                - Recent Enquiries (30 days): {enquiry_stats.get('recent_enquiries', 0)}
-                - Staff Performance: {json.dumps(enquiry_stats.get('staff_stats', []), indent=2)}
-                
-                Recent Enquiries Sample (Last 10):
-                {json.dumps(recent_enquiries, indent=2, default=str)}
-                """
-                
-            elif is_client_query or context_type == "client":
-                client_stats = self.get_client_stats()
-                recent_clients = self.get_client_data()[:10]  # Get last 10 clients for more detail
-                
-                context_data = f"""
-                CLIENT DATA CONTEXT:
-                - Total Clients: {client_stats.get('total_clients', 0)}
-                - Status Distribution: {json.dumps(client_stats.get('status_stats', []), indent=2)}
-                - Loan Status Distribution: {json.dumps(client_stats.get('loan_stats', []), indent=2)}
-                - GST Status Distribution: {json.dumps(client_stats.get('gst_stats', []), indent=2)}
-                
-                Recent Clients Sample (Last 10):
-                {json.dumps(recent_clients, indent=2, default=str)}
-                """
-            
-            # Create comprehensive prompt
-            prompt = f"""
-            You are an AI assistant for TMIS Business Guru, a business management system. 
-            You have access to detailed enquiry and client data from the system.
-            
-            SYSTEM ACCESS INSTRUCTIONS:
-            - When asked about client details, you have FULL ACCESS to client information
-            - When asked about enquiry details, you have FULL ACCESS to enquiry information
-            - You can analyze any data related to clients or enquiries
-            - You should provide comprehensive answers when asked about specific data
-            
-            {context_data}
+    def _build_prompt(self, user_query: str, context_type: Optional[str] = None) -> str:
+        """Build the Gemini prompt, with enquiry or client data when relevant"""
+        # Prepare context based on query type
+        context_data = ""
+        
+        # Determine if user is asking about enquiries or clients
+        is_enquiry_query = self._ENQUIRY_RE.search(user_query) is not None
+        is_client_query = self._CLIENT_RE.search(user_query) is not None
+        
+        # Get relevant data based on context
+        if is_enquiry_query or context_type == "enquiry":
+            stats_future = _context_executor.submit(self.get_enquiry_stats)
+            recent_enquiries = self.get_enquiry_data(limit=10)  # Get last 10 enquiries for more detail
+            enquiry_stats = stats_future.result()
+            
+            context_data = f"""
+            ENQUIRY DATA CONTEXT:
+            - Total Enquiries: {enquiry_stats.get('total_enquiries', 0)}
+            - Recent Enquiries (30 days): {enquiry_stats.get('recent_enquiries', 0)}
+            - Staff Performance: {orjson.dumps(enquiry_stats.get('staff_stats', [])[:_STAFF_STATS_LIMIT], default=str).decode()}
+            
+            Recent Enquiries Sample (Last 10):
+            {orjson.dumps(recent_enquiries, default=str).decode()}
+            """
             
-            User Query: {user_query}
+        elif is_client_query or context_type == "client":
+            stats_future = _context_executor.submit(self.get_client_stats)
+            recent_clients = self.get_client_data(limit=10)  # Get last 10 clients for more detail
+            client_stats = stats_future.result()
             
-            Instructions:
-            1. Provide accurate, detailed responses based on the data provided
-            2. If asked about specific numbers or statistics, use the exact data from the context
-            3. If asked about GST status or client details, provide comprehensive information
-            4. If asked about enquiries, provide detailed insights from the enquiry data
-            5. Be conversational but professional
-            6. If you don't have specific data to answer a question, say so clearly
-            7. Format your response in a clear, readable manner
-            8. Use bullet points or numbered lists when appropriate
-            9. When asked for analysis, provide detailed insights
-            10. When asked for specific client or enquiry information, provide all relevant details
+            context_data = f"""
+            CLIENT DATA CONTEXT:
+            - Total Clients: {client_stats.get('total_clients', 0)}
+            - Status Distribution: {orjson.dumps(client_stats.get('status_stats', [])[:_CLIENT_STATS_LIMIT], default=str).decode()}
+            - Loan Status Distribution: {orjson.dumps(client_stats.get('loan_stats', [])[:_CLIENT_STATS_LIMIT], default=str).decode()}
+            - GST Status Distribution: {orjson.dumps(client_stats.get('gst_stats', [])[:_CLIENT_STATS_LIMIT], default=str).decode()}
             
-            Respond to the user's query now with full access to the requested information:
+            Recent Clients Sample (Last 10):
+            {orjson.dumps(recent_clients, default=str).decode()}
             """
+        else:
+            # Chit-chat ("hi", "thanks"): no data, so skip the data-access preamble
+            return _SHORT_PROMPT_TEMPLATE(query=user_query)
+        
+        return _PROMPT_TEMPLATE(context=context_data, query=user_query)
+    
+    def _call_gemini(self, prompt: str, **kwargs):
+        """Call Gemini within the rate limit, backing off on quota errors"""
+        for attempt in range(_GEMINI_MAX_ATTEMPTS):
+            _gemini_bucket.acquire()
+            try:
+                return self.model.generate_content(prompt, **kwargs)
+            except ResourceExhausted as e:
+                if attempt == _GEMINI_MAX_ATTEMPTS - 1:
+                    raise
+                delay = min(2 ** attempt, _GEMINI_MAX_BACKOFF)
+                logger.warning(f"Gemini quota exhausted, retrying in {delay}s: {e}")
+                time.sleep(delay)
+    
+    def generate_response(self, user_query: str, context_type: Optional[str] = None) -> str:
+        """Generate AI response using Gemini"""
+        try:
+            prompt = self._build_prompt(user_query, context_type)
             
             # Generate response using Gemini
-            response = self.model.generate_content(prompt)
+            response = self._call_gemini(prompt)
             return response.text
             
         except Exception as e:
             logger.error(f"Error generating AI response: {e}")
-            return f"I apologize, but I encountered an error while processing your request. Please try again or contact support if the issue persists. Error: {str(e)}"
+            return _ERROR_REPLY.format(e)
+    
+    def stream_response(self, user_query: str, context_type: Optional[str] = None) -> Iterator[str]:
+        """Generate AI response using Gemini, yielding text as it is produced"""
+        try:
+            prompt = self._build_prompt(user_query, context_type)
+            for chunk in self._call_gemini(prompt, stream=True):
+                yield chunk.text
+            
+        except Exception as e:
+            logger.error(f"Error streaming AI response: {e}")
+            yield _ERROR_REPLY.format(e)
     
     def process_specific_query(self, query_type: str, parameters: Dict) -> str:
         """Process specific queries like GST lookup, mobile search etc."""
@@ -294,7 +524,7 @@ class GeminiChatbotService:
                 if not gst_number:
                     return "Please provide a GST number to search for."
                 
-                client = self.get_client_by_gst(gst_number)
+                client = self.get_client_by_gst(gst_number, _CLIENT_LOOKUP_FIELDS)
                 if client:
                     return f"""
                     **Client Found for GST: {gst_number}**
@@ -325,7 +555,7 @@ class GeminiChatbotService:
                 if not mobile_number:
                     return "Please provide a mobile number to search for."
                 
-                client = self.get_client_by_mobile(mobile_number)
+                client = self.get_client_by_mobile(mobile_number, _CLIENT_LOOKUP_FIELDS)
                 if client:
                     return f"""
                     **Client Found for Mobile: {mobile_number}**
@@ -359,15 +589,25 @@ class GeminiChatbotService:
         if not documents:
             return "• No documents uploaded yet"
         
-        doc_status = []
-        for doc_type, doc_info in documents.items():
-            if isinstance(doc_info, dict):
-                status = "✅ Uploaded" if doc_info.get('url') else "❌ Missing"
-                doc_status.append(f"• {doc_type.replace('_', ' ').title()}: {status}")
-            else:
-                doc_status.append(f"• {doc_type.replace('_', ' ').title()}: ✅ Uploaded")
-        
-        return "\n".join(doc_status) if doc_status else "• No documents uploaded yet"
+        # Only the type names and whether each has a URL affect the output
+        return _render_documents_status(tuple(
+            (doc_type, bool(doc_info.get('url')) if isinstance(doc_info, dict) else True)
+            for doc_type, doc_info in documents.items()
+        ))
+
+@functools.lru_cache(maxsize=256)
+def _doc_type_label(doc_type: str) -> str:
+    """Display label for a document type, e.g. 'gst_document' -> 'Gst Document'"""
+    return doc_type.replace('_', ' ').title()
+
+@functools.lru_cache(maxsize=256)
+def _render_documents_status(signature: tuple) -> str:
+    """Render (doc_type, uploaded) pairs as the documents status list"""
+    doc_status = [
+        f"• {_doc_type_label(doc_type)}: {'✅ Uploaded' if uploaded else '❌ Missing'}"
+        for doc_type, uploaded in signature
+    ]
+    return "\n".join(doc_status) if doc_status else "• No documents uploaded yet"
 
 # Create global instance
 try:
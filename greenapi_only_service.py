@@ -5,38 +5,141 @@ Send WhatsApp messages to ANY number without OTP verification
 """
 
 import requests
-import json
+import orjson
 import os
+import re
+import time
+import asyncio
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (values already in the environment win)
+load_dotenv(override=False)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Optional async HTTP/2 client for AsyncGreenAPIOnlyService
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+# Retry transient GreenAPI failures at the connection-pool level. Read
+# errors are never retried: the POST may already have been delivered, and a
+# retry would send the WhatsApp message twice. Once retries run out the last
+# 429/5xx response is returned, so callers still see its status code.
+_RETRY = Retry(
+    total=2,
+    connect=2,
+    read=0,
+    backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET", "POST"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+# (connect, read) timeouts - a dead endpoint fails in ~3s instead of 30
+_SEND_TIMEOUT = (3.05, 10)
+_STATUS_TIMEOUT = (3.05, 7)
+
+# Request bodies are pre-encoded with orjson, so the content type is set by hand
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Anything that is not a digit in a phone number
+_NON_DIGIT_RE = re.compile(r'\D+')
+
+# Concurrent sends in send_bulk (kept <= the adapter's pool_maxsize)
+_MAX_SEND_WORKERS = 16
+# Messages dispatched per send_bulk batch
+_MAX_BATCH_SIZE = 50
+# Seconds a successful check_status result is reused
+_STATUS_CACHE_TTL = 5.0
+
+# Shared shapes of the result dicts (always copied with {**base, ...})
+_SUCCESS_BASE = {'success': True, 'service': 'GreenAPI Only', 'no_otp_required': True, 'no_facebook_needed': True}
+_SEND_ERROR_BASE = {'success': False, 'service': 'GreenAPI Only'}
+_STATUS_ERROR_BASE = {'connected': False, 'service': 'GreenAPI Only'}
+_ERR_NO_CREDS = {
+    'success': False,
+    'error': 'GreenAPI credentials not configured',
+    'solution': 'Add GREENAPI_INSTANCE_ID and GREENAPI_TOKEN to .env file'
+}
+_NETWORK_SOLUTION = 'Check internet connection and GreenAPI URL'
+
+@dataclass(frozen=True, slots=True)
+class _Config:
+    """GreenAPI credentials and endpoints, resolved once per process"""
+    instance_id: str
+    token: str
+    base_url: str
+    send_url: str
+    status_url: str
+
+@functools.lru_cache(maxsize=64)
+def _build_urls(base_url: str, instance_id: str, token: str) -> Tuple[str, str]:
+    """(sendMessage URL, getStateInstance URL) for one GreenAPI instance"""
+    return (
+        f"{base_url}/waInstance{instance_id}/sendMessage/{token}",
+        f"{base_url}/waInstance{instance_id}/getStateInstance/{token}"
+    )
+
+@functools.lru_cache(maxsize=1)
+def _load_config() -> Optional[_Config]:
+    """Read GreenAPI settings from the environment on first use; None if credentials are missing"""
+    instance_id = os.getenv('GREENAPI_INSTANCE_ID')
+    token = os.getenv('GREENAPI_TOKEN')
+    if not (instance_id and token):
+        return None
+    
+    base_url = os.getenv('GREENAPI_BASE_URL') or f"https://{instance_id}.api.greenapi.com"
+    send_url, status_url = _build_urls(base_url, instance_id, token)
+    return _Config(
+        instance_id=instance_id,
+        token=token,
+        base_url=base_url,
+        send_url=send_url,
+        status_url=status_url
+    )
+
 class GreenAPIOnlyService:
     """Pure GreenAPI service - No Facebook API dependency"""
     
     def __init__(self):
-        self.instance_id = os.getenv('GREENAPI_INSTANCE_ID')
-        self.token = os.getenv('GREENAPI_TOKEN')
-        self.base_url = os.getenv('GREENAPI_BASE_URL')
+        self.cfg = _load_config()
+        
+        # Last successful check_status result and when it was fetched
+        self._status_cache = None
+        self._status_cache_ts = 0.0
         
-        if self.instance_id and self.token:
-            if not self.base_url:
-                self.base_url = f"https://{self.instance_id}.api.greenapi.com"
+        if self.cfg:
+            self.instance_id = self.cfg.instance_id
+            self.token = self.cfg.token
+            self.base_url = self.cfg.base_url
+            
+            # One keep-alive session so sends reuse the TLS connection
+            self.session = requests.Session()
+            self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=_RETRY))
             
             self.api_available = True
-            logger.info(f"🌿 GreenAPI Only Service initialized")
-            logger.info(f"📱 Instance ID: {self.instance_id}")
-            logger.info(f"🌐 Base URL: {self.base_url}")
-            logger.info(f"✅ NO FACEBOOK API NEEDED!")
-            logger.info(f"🚀 Send to ANY number without OTP!")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("🌿 GreenAPI Only Service initialized")
+                logger.info("📱 Instance ID: %s", self.instance_id)
+                logger.info("🌐 Base URL: %s", self.base_url)
+                logger.info("✅ NO FACEBOOK API NEEDED!")
+                logger.info("🚀 Send to ANY number without OTP!")
         else:
+            self.instance_id = self.token = self.base_url = None
             self.api_available = False
             logger.error("❌ GreenAPI credentials missing in .env file")
     
@@ -52,96 +155,81 @@ class GreenAPIOnlyService:
             Dict: Response from GreenAPI
         """
         if not self.api_available:
-            return {
-                'success': False,
-                'error': 'GreenAPI credentials not configured',
-                'solution': 'Add GREENAPI_INSTANCE_ID and GREENAPI_TOKEN to .env file'
-            }
+            return {**_ERR_NO_CREDS}
         
         try:
             # Format phone number for GreenAPI
             formatted_number = self._format_phone_number(phone_number)
             
-            logger.info(f"🌿 GreenAPI - Sending to {formatted_number}")
-            logger.info(f"✅ NO OTP REQUIRED!")
-            logger.info(f"🚀 NO FACEBOOK API NEEDED!")
-            
-            # GreenAPI endpoint
-            url = f"{self.base_url}/waInstance{self.instance_id}/sendMessage/{self.token}"
+            logger.info("🌿 GreenAPI - Sending to %s", formatted_number)
+            logger.debug("✅ NO OTP REQUIRED! 🚀 NO FACEBOOK API NEEDED!")
             
             data = {
                 "chatId": formatted_number,
                 "message": message
             }
             
-            logger.info(f"📤 URL: {url}")
-            logger.info(f"📤 Payload: {json.dumps(data, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📤 URL: %s", self.cfg.send_url)
+                logger.debug("📤 Payload: %s", data)
             
-            response = requests.post(url, json=data, timeout=30)
+            response = self.session.post(
+                self.cfg.send_url,
+                data=orjson.dumps(data),
+                headers=_JSON_HEADERS,
+                timeout=_SEND_TIMEOUT
+            )
             
-            logger.info(f"📥 Status Code: {response.status_code}")
-            logger.info(f"📥 Response Text: {response.text}")
+            logger.info("📥 Status Code: %s", response.status_code)
             
-            if response.status_code == 200:
-                try:
-                    response_data = response.json()
-                    logger.info(f"📥 Response JSON: {json.dumps(response_data, indent=2)}")
-                    
-                    if response_data.get('idMessage'):
-                        logger.info(f"✅ SUCCESS! Message sent to {formatted_number}")
-                        return {
-                            'success': True,
-                            'message_id': response_data.get('idMessage'),
-                            'service': 'GreenAPI Only',
-                            'no_otp_required': True,
-                            'no_facebook_needed': True,
-                            'response': response_data
-                        }
-                    else:
-                        logger.warning(f"⚠️ No message ID in response")
-                        return {
-                            'success': False,
-                            'error': 'No message ID returned',
-                            'service': 'GreenAPI Only',
-                            'response': response_data
-                        }
-                except json.JSONDecodeError:
-                    logger.error(f"❌ Invalid JSON response: {response.text}")
-                    return {
-                        'success': False,
-                        'error': f'Invalid JSON response: {response.text}',
-                        'service': 'GreenAPI Only'
-                    }
-            else:
-                logger.error(f"❌ HTTP Error: {response.status_code}")
-                logger.error(f"❌ Response: {response.text}")
-                return {
-                    'success': False,
-                    'error': f'HTTP {response.status_code}: {response.text}',
-                    'service': 'GreenAPI Only',
-                    'status_code': response.status_code
-                }
+            return self._send_result(formatted_number, response)
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Network error: {str(e)}")
-            return {
-                'success': False,
-                'error': f'Network error: {str(e)}',
-                'service': 'GreenAPI Only',
-                'solution': 'Check internet connection and GreenAPI URL'
-            }
+            logger.error("❌ Network error: %s", e)
+            return {**_SEND_ERROR_BASE, 'error': f'Network error: {str(e)}', 'solution': _NETWORK_SOLUTION}
         except Exception as e:
-            logger.error(f"❌ Unexpected error: {str(e)}")
+            logger.error("❌ Unexpected error: %s", e)
+            return {**_SEND_ERROR_BASE, 'error': f'Unexpected error: {str(e)}'}
+    
+    def _send_result(self, formatted_number: str, response) -> Dict[str, Any]:
+        """Turn a sendMessage HTTP response (requests or httpx) into a result dict"""
+        # orjson parses the raw bytes directly - no str decode, no second copy
+        if response.status_code == 200:
+            try:
+                response_data = orjson.loads(response.content)
+                logger.debug("📥 Response JSON: %s", response_data)
+                
+                if response_data.get('idMessage'):
+                    logger.info("✅ SUCCESS! Message sent to %s", formatted_number)
+                    return {**_SUCCESS_BASE, 'message_id': response_data['idMessage'], 'response': response_data}
+                else:
+                    logger.warning("⚠️ No message ID in response")
+                    return {**_SEND_ERROR_BASE, 'error': 'No message ID returned', 'response': response_data}
+            except orjson.JSONDecodeError:
+                # .text re-decodes (and may sniff the charset) on every access; read it once
+                text = response.text
+                logger.error("❌ Invalid JSON response: %s", text)
+                return {**_SEND_ERROR_BASE, 'error': f'Invalid JSON response: {text}'}
+        else:
+            text = response.text
+            logger.error("❌ HTTP Error: %s - %s", response.status_code, text)
             return {
-                'success': False,
-                'error': f'Unexpected error: {str(e)}',
-                'service': 'GreenAPI Only'
+                **_SEND_ERROR_BASE,
+                'error': f'HTTP {response.status_code}: {text}',
+                'status_code': response.status_code
             }
     
-    def _format_phone_number(self, phone_number: str) -> str:
+    def close(self):
+        """Release the pooled HTTP connections"""
+        if self.api_available:
+            self.session.close()
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _format_phone_number(phone_number: str) -> str:
         """Format phone number for GreenAPI"""
-        # Remove any non-digit characters
-        clean_number = ''.join(filter(str.isdigit, phone_number))
+        # Remove any non-digit characters (already-clean numbers skip the regex)
+        clean_number = phone_number if phone_number.isdecimal() else _NON_DIGIT_RE.sub('', phone_number)
         
         # If number is 10 digits, assume it's Indian number and add country code
         if len(clean_number) == 10:
@@ -150,82 +238,155 @@ class GreenAPIOnlyService:
         # GreenAPI expects format: 919876543210@c.us
         return f"{clean_number}@c.us"
     
-    def check_status(self) -> Dict[str, Any]:
-        """Check GreenAPI connection status"""
+    def check_status(self, force: bool = False) -> Dict[str, Any]:
+        """Check GreenAPI connection status (cached briefly; force=True bypasses the cache)"""
         if not self.api_available:
             return {
                 'connected': False,
                 'error': 'GreenAPI credentials not configured'
             }
         
+        now = time.monotonic()
+        if not force and self._status_cache is not None and now - self._status_cache_ts < _STATUS_CACHE_TTL:
+            return self._status_cache
+        
         try:
-            url = f"{self.base_url}/waInstance{self.instance_id}/getStateInstance/{self.token}"
-            logger.info(f"📡 Checking status: {url}")
+            logger.debug("📡 Checking status: %s", self.cfg.status_url)
             
-            response = requests.get(url, timeout=10)
-            logger.info(f"📡 Status response: {response.status_code}")
-            logger.info(f"📡 Status text: {response.text}")
+            response = self.session.get(self.cfg.status_url, timeout=_STATUS_TIMEOUT)
+            logger.info("📡 Status response: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📡 Status text: %s", response.text)
             
             if response.status_code == 200:
                 try:
-                    response_data = response.json()
+                    response_data = orjson.loads(response.content)
                     state = response_data.get('stateInstance', 'unknown')
                     
-                    return {
+                    result = {
                         'connected': state == 'authorized',
                         'state': state,
                         'status': response_data,
                         'service': 'GreenAPI Only',
                         'no_facebook_needed': True
                     }
-                except json.JSONDecodeError:
-                    return {
-                        'connected': False,
-                        'error': f'Invalid JSON response: {response.text}',
-                        'service': 'GreenAPI Only'
-                    }
+                    # Only successful lookups are cached; errors are retried next call
+                    self._status_cache, self._status_cache_ts = result, now
+                    return result
+                except orjson.JSONDecodeError:
+                    return {**_STATUS_ERROR_BASE, 'error': f'Invalid JSON response: {response.text}'}
             else:
-                return {
-                    'connected': False,
-                    'error': f'HTTP {response.status_code}: {response.text}',
-                    'service': 'GreenAPI Only'
-                }
+                return {**_STATUS_ERROR_BASE, 'error': f'HTTP {response.status_code}: {response.text}'}
                 
         except Exception as e:
-            return {
-                'connected': False,
-                'error': f'Status check error: {str(e)}',
-                'service': 'GreenAPI Only'
-            }
+            return {**_STATUS_ERROR_BASE, 'error': f'Status check error: {str(e)}'}
+    
+    def send_bulk(self, items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Send many (phone_number, message) pairs, returning results in input order
+        
+        GreenAPI has no multi-recipient send endpoint, so each batch is fanned
+        out concurrently over the session's kept-alive connections.
+        """
+        results = []
+        if not items:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=min(_MAX_SEND_WORKERS, len(items)),
+                                thread_name_prefix='greenapi-send') as executor:
+            for start in range(0, len(items), _MAX_BATCH_SIZE):
+                batch = items[start:start + _MAX_BATCH_SIZE]
+                results.extend(executor.map(lambda item: self.send_message(*item), batch))
+        
+        return results
     
     def test_multiple_numbers(self, numbers: list) -> Dict[str, Any]:
         """Test sending messages to multiple numbers"""
-        results = {}
-        
         logger.info(f"🧪 Testing GreenAPI with {len(numbers)} numbers...")
         logger.info(f"✅ NO OTP required for ANY number!")
         logger.info(f"🚀 NO Facebook API needed!")
         
-        for number in numbers:
-            logger.info(f"\n📱 Testing {number}...")
-            result = self.send_message(
-                number, 
-                f"🎉 GreenAPI Success! Message sent to {number} without OTP or Facebook API!"
+        items = [
+            (number, f"🎉 GreenAPI Success! Message sent to {number} without OTP or Facebook API!")
+            for number in numbers
+        ]
+        return dict(zip(numbers, self.send_bulk(items)))
+
+class AsyncGreenAPIOnlyService:
+    """asyncio GreenAPI sender - many concurrent sends multiplexed over one HTTP/2 connection"""
+    
+    def __init__(self, service: Optional[GreenAPIOnlyService] = None):
+        # Reuse the sync service's credentials, endpoints and response handling
+        self._service = service or GreenAPIOnlyService()
+        self.api_available = self._service.api_available and HTTPX_AVAILABLE
+        
+        if self.api_available:
+            self.client = httpx.AsyncClient(
+                http2=True,
+                timeout=httpx.Timeout(_SEND_TIMEOUT[1], connect=_SEND_TIMEOUT[0]),
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
             )
-            results[number] = result
+        elif not HTTPX_AVAILABLE:
+            logger.error("❌ httpx not installed - async GreenAPI sends unavailable")
+    
+    async def send_message(self, phone_number: str, message: str) -> Dict[str, Any]:
+        """Async counterpart of GreenAPIOnlyService.send_message"""
+        if not self.api_available:
+            return {
+                'success': False,
+                'error': 'GreenAPI async client not configured',
+                'solution': 'Add GREENAPI_INSTANCE_ID and GREENAPI_TOKEN to .env file and install httpx[http2]'
+            }
         
-        return results
+        try:
+            formatted_number = self._service._format_phone_number(phone_number)
+            logger.info("🌿 GreenAPI (async) - Sending to %s", formatted_number)
+            
+            response = await self.client.post(
+                self._service.cfg.send_url,
+                content=orjson.dumps({"chatId": formatted_number, "message": message}),
+                headers=_JSON_HEADERS
+            )
+            logger.info("📥 Status Code: %s", response.status_code)
+            
+            return self._service._send_result(formatted_number, response)
+            
+        except httpx.HTTPError as e:
+            logger.error("❌ Network error: %s", e)
+            return {**_SEND_ERROR_BASE, 'error': f'Network error: {str(e)}', 'solution': _NETWORK_SOLUTION}
+        except Exception as e:
+            logger.error("❌ Unexpected error: %s", e)
+            return {**_SEND_ERROR_BASE, 'error': f'Unexpected error: {str(e)}'}
+    
+    async def send_many(self, items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Send (phone_number, message) pairs concurrently, results in input order"""
+        return await asyncio.gather(*(self.send_message(number, message) for number, message in items))
+    
+    async def aclose(self):
+        """Close the underlying HTTP/2 client"""
+        if self.api_available:
+            await self.client.aclose()
 
-# Create global instance
-try:
-    greenapi_only_service = GreenAPIOnlyService()
-    logger.info("✅ GreenAPI Only Service ready")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize GreenAPI Only Service: {e}")
-    greenapi_only_service = None
+@functools.cache
+def get_greenapi_service() -> Optional[GreenAPIOnlyService]:
+    """Create the shared service on first use (None if it fails to initialize)"""
+    try:
+        service = GreenAPIOnlyService()
+        logger.info("✅ GreenAPI Only Service ready")
+        return service
+    except Exception as e:
+        logger.error(f"❌ Failed to initialize GreenAPI Only Service: {e}")
+        return None
+
+def __getattr__(name):
+    # Keep `from greenapi_only_service import greenapi_only_service` working without an import-time instance
+    if name == 'greenapi_only_service':
+        return get_greenapi_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
     """Test the GreenAPI only service"""
+    greenapi_only_service = get_greenapi_service()
     if greenapi_only_service and greenapi_only_service.api_available:
         print("🌿 GreenAPI Only Service Test")
         print("=" * 50)
@@ -6,9 +6,17 @@ Enhanced with template support for TMIS enquiry system
 """
 
 import requests
-import json
+import orjson
 import os
+import re
+import string
+import functools
+import time
+import random
 import logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rate_limit import TokenBucket
 from dotenv import load_dotenv
 from typing import Dict, Optional, Any
 
@@ -19,273 +27,91 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class GreenAPIWhatsAppService:
-    """WhatsApp service using GreenAPI - NO OTP REQUIRED"""
-    
-    def __init__(self):
-        self.instance_id = os.getenv('GREENAPI_INSTANCE_ID')
-        self.token = os.getenv('GREENAPI_TOKEN')
-        
-        logger.info(f"🔧 GreenAPI Initialization:")
-        logger.info(f"   Instance ID: {self.instance_id}")
-        logger.info(f"   Token: {'Present' if self.token else 'Missing'}")
-        
-        if self.instance_id and self.token:
-            # Use the correct GreenAPI endpoint format
-            self.base_url = "https://api.green-api.com"
-            self.api_available = True
-            logger.info(f"✅ GreenAPI WhatsApp Service initialized - NO OTP REQUIRED")
-            logger.info(f"   Instance ID: {self.instance_id}")
-            logger.info(f"   Base URL: {self.base_url}")
-        else:
-            self.api_available = False
-            logger.error("❌ GreenAPI credentials not found in .env file")
-            logger.error(f"   Missing: GREENAPI_INSTANCE_ID={bool(self.instance_id)}, GREENAPI_TOKEN={bool(self.token)}")
-    
-    def send_message(self, phone_number: str, message: str) -> Dict[str, Any]:
-        """
-        Send WhatsApp message via GreenAPI (no OTP required)
-        
-        Args:
-            phone_number (str): Phone number with country code
-            message (str): Message text
-            
-        Returns:
-            Dict: Response from GreenAPI
-        """
-        if not self.api_available:
-            return {
-                'success': False,
-                'error': 'GreenAPI credentials not configured',
-                'solution': 'Add GREENAPI_INSTANCE_ID and GREENAPI_TOKEN to .env file'
-            }
-        
-        try:
-            # Format phone number for GreenAPI
-            formatted_number = self._format_phone_number(phone_number)
-            
-            logger.info(f"🚀 GreenAPI - Sending to {formatted_number} (NO OTP REQUIRED)")
-            logger.info(f"📱 Original phone number: {phone_number}")
-            logger.info(f"📞 Formatted phone number: {formatted_number}")
-            
-            # Construct URL with proper formatting
-            url = f"{self.base_url}/waInstance{self.instance_id}/sendMessage/{self.token}"
-            logger.info(f"📤 Send URL: {url}")
-            
-            # Prepare data with proper structure
-            data = {
-                "chatId": formatted_number,
-                "message": message
-            }
-            
-            logger.info(f"📤 GreenAPI Payload: {json.dumps(data, indent=2, ensure_ascii=False)}")
-            logger.info(f"📡 URL: {url}")
-            
-            # Add headers for proper API communication
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
-            
-            logger.info(f"📤 Headers: {headers}")
-            
-            # Send request with timeout and headers
-            response = requests.post(url, json=data, headers=headers, timeout=30)
-            response_data = response.json() if response.content else {}
-            
-            logger.info(f"📥 GreenAPI Response Status Code: {response.status_code}")
-            logger.info(f"📥 GreenAPI Response Headers: {dict(response.headers)}")
-            logger.info(f"📥 GreenAPI Response Content: {response.text}")
-            logger.info(f"📥 GreenAPI Response Data: {json.dumps(response_data, indent=2, ensure_ascii=False) if response_data else 'No response data'}")
-            
-            if response.status_code == 200 and response_data.get('idMessage'):
-                logger.info(f"✅ GreenAPI SUCCESS! Message sent to {formatted_number}")
-                return {
-                    'success': True,
-                    'message_id': response_data.get('idMessage'),
-                    'service': 'GreenAPI',
-                    'no_otp_required': True,
-                    'response': response_data
-                }
-            else:
-                # Handle different error cases
-                if response.status_code == 400:
-                    error_msg = response_data.get('message', 'Bad Request - Check phone number format or validity')
-                elif response.status_code == 401:
-                    error_msg = response_data.get('message', 'Unauthorized - Check API credentials')
-                elif response.status_code == 403:
-                    error_msg = response_data.get('message', 'Forbidden - Check API permissions')
-                elif response.status_code == 404:
-                    error_msg = response_data.get('message', 'Not Found - Check API endpoint')
-                elif response.status_code == 466:
-                    # Special handling for GreenAPI quota exceeded error
-                    error_msg = response_data.get('invokeStatus', {}).get('description', 'Monthly quota exceeded')
-                    if not error_msg or error_msg == 'Monthly quota exceeded':
-                        error_msg = 'Monthly quota has been exceeded. Upgrade your GreenAPI plan to send to more numbers'
-                else:
-                    error_msg = response_data.get('message', f'Unknown GreenAPI error (Status: {response.status_code})')
-                
-                logger.error(f"❌ GreenAPI FAILED: {error_msg}")
-                logger.error(f"❌ Status Code: {response.status_code}")
-                logger.error(f"❌ Response Data: {json.dumps(response_data, indent=2, ensure_ascii=False) if response_data else 'No response data'}")
-                
-                # Provide more detailed error information
-                detailed_error = f'GreenAPI error: {error_msg}'
-                if response.status_code == 400:
-                    detailed_error += ' (Bad Request - Check phone number format, validity, or if the number has WhatsApp)'
-                elif response.status_code == 401:
-                    detailed_error += ' (Unauthorized - Check API credentials)'
-                elif response.status_code == 403:
-                    detailed_error += ' (Forbidden - Check API permissions)'
-                elif response.status_code == 404:
-                    detailed_error += ' (Not Found - Check API endpoint)'
-                elif response.status_code == 466:
-                    detailed_error += ' (Monthly quota exceeded - Upgrade your GreenAPI plan to send to more numbers. Test number 8106811285 still works)'
-                
-                result = {
-                    'success': False,
-                    'error': detailed_error,
-                    'service': 'GreenAPI',
-                    'status_code': response.status_code,
-                    'response': response_data,
-                    'original_phone_number': phone_number,
-                    'formatted_phone_number': formatted_number
-                }
-                
-                # Add quota-specific information for 466 errors
-                if response.status_code == 466:
-                    result['quota_exceeded'] = True
-                    result['working_test_number'] = '8106811285'
-                    result['upgrade_url'] = 'https://console.green-api.com'
-                    result['solution'] = 'Upgrade GreenAPI plan or use test number 8106811285'
-                
-                return result
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ GreenAPI Network error: {str(e)}")
-            return {
-                'success': False,
-                'error': f'GreenAPI network error: {str(e)}',
-                'service': 'GreenAPI',
-                'original_phone_number': phone_number
-            }
-        except Exception as e:
-            logger.error(f"❌ GreenAPI Unexpected error: {str(e)}")
-            import traceback
-            logger.error(f"❌ Error traceback: {traceback.format_exc()}")
-            return {
-                'success': False,
-                'error': f'GreenAPI unexpected error: {str(e)}',
-                'service': 'GreenAPI',
-                'original_phone_number': phone_number
-            }
-    
-    def _format_phone_number(self, phone_number: str) -> str:
-        """Format phone number for GreenAPI"""
-        # Handle None or empty phone number
-        if not phone_number:
-            logger.warning("📱 _format_phone_number - Empty phone number provided")
-            return ""
-        
-        # Remove any non-digit characters
-        clean_number = ''.join(filter(str.isdigit, str(phone_number)))
-        
-        logger.info(f"📱 _format_phone_number - Input: {phone_number}, Cleaned: {clean_number}, Length: {len(clean_number)}")
-        
-        # Handle different cases based on number length
-        if len(clean_number) == 0:
-            logger.warning(f"   ⚠️ Invalid phone number format (empty): {phone_number}")
-            return ""
-        elif len(clean_number) < 10:
-            # Too short - might be missing country code, try to add India code
-            if len(clean_number) >= 8:
-                clean_number = '91' + clean_number
-                logger.info(f"   🇮🇳 Adding India country code 91 to short number: {clean_number}")
-            else:
-                logger.warning(f"   ⚠️ Invalid phone number format (too short): {phone_number}")
-        elif len(clean_number) == 10:
-            # Exactly 10 digits - assume it's an Indian number and add country code 91
-            clean_number = '91' + clean_number
-            logger.info(f"   🇮🇳 Adding India country code 91 to 10-digit number: {clean_number}")
-        elif len(clean_number) > 15:
-            # Too long - might be malformed, try to fix common issues
-            logger.warning(f"   ⚠️ Phone number too long: {phone_number}")
-            # If it starts with country code, keep only first 12 digits (country code + 10 digits)
-            if clean_number.startswith('91') and len(clean_number) > 12:
-                clean_number = clean_number[:12]
-                logger.info(f"   ✂️ Truncated long Indian number: {clean_number}")
-            elif len(clean_number) > 15:
-                # Keep only first 15 digits
-                clean_number = clean_number[:15]
-                logger.info(f"   ✂️ Truncated very long number: {clean_number}")
-        
-        # GreenAPI expects format: 919876543210@c.us
-        formatted_number = f"{clean_number}@c.us"
-        logger.info(f"✅ Final formatted phone number: {phone_number} -> {formatted_number}")
-        return formatted_number
-    
-    def check_status(self) -> Dict[str, Any]:
-        """Check GreenAPI connection status"""
-        if not self.api_available:
-            return {
-                'connected': False,
-                'error': 'GreenAPI credentials not configured'
-            }
-        
-        try:
-            url = f"{self.base_url}/waInstance{self.instance_id}/getStateInstance/{self.token}"
-            
-            logger.info(f"📡 Checking GreenAPI status: {url}")
-            response = requests.get(url, timeout=15)
-            
-            logger.info(f"📡 Status Code: {response.status_code}")
-            
-            if response.status_code == 200:
-                response_data = response.json()
-                logger.info(f"📡 GreenAPI Status Response: {json.dumps(response_data, indent=2)}")
-                
-                state = response_data.get('stateInstance', 'unknown')
-                return {
-                    'connected': state == 'authorized',
-                    'state': state,
-                    'status': response_data,
-                    'service': 'GreenAPI',
-                    'endpoint': url
-                }
-            else:
-                error_text = response.text
-                logger.error(f"📡 GreenAPI Error Response: {error_text}")
-                return {
-                    'connected': False,
-                    'error': f'GreenAPI HTTP {response.status_code}: {error_text}',
-                    'service': 'GreenAPI',
-                    'endpoint': url
-                }
-                
-        except requests.exceptions.Timeout:
-            logger.error("📡 GreenAPI request timeout")
-            return {
-                'connected': False,
-                'error': 'GreenAPI request timeout (15 seconds)',
-                'service': 'GreenAPI'
-            }
-        except Exception as e:
-            logger.error(f"📡 GreenAPI status check error: {str(e)}")
-            return {
-                'connected': False,
-                'error': f'GreenAPI status check error: {str(e)}',
-                'service': 'GreenAPI'
-            }
-    
-    def get_message_templates(self) -> Dict[str, str]:
-        """
-        Get predefined message templates for different enquiry scenarios
-        
-        Returns:
-            Dict: Dictionary of template names and messages
-        """
-        return {
-            'new_enquiry': """Hi {wati_name}👋 Welcome to Business Guru Loans!
+# Optional HTTP/2 client (httpx[http2]); without it the service falls back to a requests session
+try:
+    import httpx
+    import h2  # noqa: F401 - required by httpx for http2=True
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+# Exceptions raised by whichever HTTP client is in use
+if HTTPX_AVAILABLE:
+    _NETWORK_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+    _TIMEOUT_ERRORS = (requests.exceptions.Timeout, httpx.TimeoutException)
+else:
+    _NETWORK_ERRORS = (requests.exceptions.RequestException,)
+    _TIMEOUT_ERRORS = (requests.exceptions.Timeout,)
+
+# Retry transient GreenAPI failures at the connection-pool level (sendMessage
+# status retries are done by _post_json, with jitter)
+_RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET"]
+)
+
+# sendMessage retry policy: statuses, attempts and backoff bounds (seconds)
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_SEND_MAX_ATTEMPTS = 3
+_BACKOFF_BASE = 0.5
+_BACKOFF_CAP = 8.0
+
+def _retry_delay(response, attempt: int) -> float:
+    """Seconds to wait before retrying: Retry-After if given, else jittered exponential backoff"""
+    retry_after = response.headers.get('Retry-After', '')
+    if retry_after.isdigit():
+        return min(float(retry_after), _BACKOFF_CAP)
+    return min(_BACKOFF_BASE * (2 ** attempt), _BACKOFF_CAP) + random.uniform(0, 0.5)
+
+# GreenAPI per-instance request limits (requests per second)
+_SEND_MESSAGE_RATE = 50
+_STATE_INSTANCE_RATE = 1
+
+# Shared by every service object in the process, since the limits are per GreenAPI instance
+_send_bucket = TokenBucket(_SEND_MESSAGE_RATE, _SEND_MESSAGE_RATE)
+_status_bucket = TokenBucket(_STATE_INSTANCE_RATE, _STATE_INSTANCE_RATE)
+
+# Per HTTP status: (fallback error message, hint appended to the detailed error)
+_STATUS_HINTS = {
+    400: ('Bad Request - Check phone number format or validity',
+          'Bad Request - Check phone number format, validity, or if the number has WhatsApp'),
+    401: ('Unauthorized - Check API credentials', 'Unauthorized - Check API credentials'),
+    403: ('Forbidden - Check API permissions', 'Forbidden - Check API permissions'),
+    404: ('Not Found - Check API endpoint', 'Not Found - Check API endpoint'),
+}
+# GreenAPI answers 466 when the monthly quota is used up
+_QUOTA_EXCEEDED_HINT = 'Monthly quota exceeded - Upgrade your GreenAPI plan to send to more numbers. Test number 8106811285 still works'
+
+# Shared shapes of the send_message result dicts (always copied with {**base, ...})
+_SEND_SUCCESS_BASE = {'success': True, 'service': 'GreenAPI', 'no_otp_required': True}
+_SEND_ERROR_BASE = {'success': False, 'service': 'GreenAPI'}
+_ERR_NO_CREDS = {
+    'success': False,
+    'error': 'GreenAPI credentials not configured',
+    'solution': 'Add GREENAPI_INSTANCE_ID and GREENAPI_TOKEN to .env file'
+}
+_QUOTA_EXCEEDED_EXTRAS = {
+    'quota_exceeded': True,
+    'working_test_number': '8106811285',
+    'upgrade_url': 'https://console.green-api.com',
+    'solution': 'Upgrade GreenAPI plan or use test number 8106811285'
+}
+
+# Request headers for sendMessage
+_JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json'
+}
+
+# Anything that is not a digit in a phone number
+_NON_DIGIT_RE = re.compile(r'\D+')
+
+# Enquiry message templates, keyed by message type (built once at import)
+_MESSAGE_TEMPLATES = {
+    'new_enquiry': """Hi {wati_name}👋 Welcome to Business Guru Loans!
 
 Get ₹10 Lakhs in 24 hours for your business:
 
@@ -317,8 +143,8 @@ Your success journey begins now! 🚀
 🔗 Check Eligibility: https://wa.me/918106811285?text=Check%20Eligibility
 
 🔗 More Details: https://wa.me/918106811285?text=More%20Details""",
-            
-            'new_enquiry_public_form': """Hi {wati_name}👋 Welcome to Business Guru Loans!
+    
+    'new_enquiry_public_form': """Hi {wati_name}👋 Welcome to Business Guru Loans!
 
 Get ₹10 Lakhs in 24 hours for your business:
 
@@ -347,20 +173,20 @@ Your success journey begins now! 🚀
 🔗 Check Eligibility: https://wa.me/918106811285?text=Check%20Eligibility
 
 🔗 More Details: https://wa.me/918106811285?text=More%20Details""",
-            
-            'no_gst': """Hii {wati_name} sir/madam! 🙏
+    
+    'no_gst': """Hii {wati_name} sir/madam! 🙏
 
 We regret to inform you that we're unable to process your loan application at this time due to the absence of GST registration. GST registration is a mandatory requirement for our collateral loan services as it helps us verify your business credentials and compliance status. We recommend you to register for GST at the earliest convenience through the official portal. Once you've completed your GST registration, please contact us again so we can proceed with your application. 
 
 Thank you for your understanding! 📋❌""",
-            
-            'gst_cancelled': """Hii {wati_name} sir/madam! 🙏
+    
+    'gst_cancelled': """Hii {wati_name} sir/madam! 🙏
 
 We've noticed that your GST status is currently showing as cancelled in our records. To proceed with your loan application, we require an active GST registration with proper compliance. We kindly request you to reactivate your GST by filling out your previous GST forms and completing all necessary formalities with the tax authorities. Once your GST status is active again, please inform us immediately so we can continue processing your application without any delays.
 
 Thank you for your prompt attention to this matter! 📝🔄""",
-            
-            'will_share_doc': """Hii {wati_name} sir/madam! 🙏
+    
+    'will_share_doc': """Hii {wati_name} sir/madam! 🙏
 
 Thank you for your interest in Business Guru! To proceed with verification of your loan application, we require the following documents:
 
@@ -377,129 +203,425 @@ Thank you for your interest in Business Guru! To proceed with verification of yo
 11. Business Photos (Name board, Products, Shop)
 
 Please share these documents at your earliest convenience to avoid delays. 📂✅""",
-            
-            'doc_shared': """Hii {wati_name} sir/madam! 🙏
+    
+    'doc_shared': """Hii {wati_name} sir/madam! 🙏
 
 Thank you for sharing your documents with us! Our verification team is currently reviewing all the submitted documents to assess your eligibility for our collateral loan services. This comprehensive verification process typically takes 2-3 business days to complete. We'll notify you immediately if any additional documents are required or if there are any changes needed in the submitted documents. 
 
 Rest assured, our team is working diligently to process your application as quickly as possible. 
 
 Thank you for your patience! 📋🔍""",
-            
-            'verified_shortlisted': """Hii {wati_name} sir/madam! 🎉
+    
+    'verified_shortlisted': """Hii {wati_name} sir/madam! 🎉
 
 Congratulations! Your account has been successfully verified and shortlisted for our collateral loan program. This is a significant milestone in your loan application process with Business Guru. Our dedicated account manager will contact you within 2 working days to discuss the next steps, including detailed loan terms, competitive interest rates, processing fees, and disbursement procedures. We understand your eagerness and assure you that we're committed to providing you with the best financial solutions for your business growth and success in the coming days.
 
 We're excited to partner with you and support your business growth journey. 
 
 Thank you! 🚀⭐""",
-            
-            'not_eligible': """Hii {wati_name} sir/madam! 🙏
+    
+    'not_eligible': """Hii {wati_name} sir/madam! 🙏
 
 Thank you for reaching out to Business Guru. After carefully reviewing your application and business profile for {business_nature}, we regret to inform you that we're unable to provide a loan at this time. Our decision is based on our current lending criteria, risk assessment policies, and internal evaluation process. 
 
 We appreciate your interest in our services and encourage you to contact us again in the future as our policies may change. 
 
 Thank you for understanding! 📉❌""",
-            
-            'no_msme': """Hii {wati_name} sir/madam! 🙏
+    
+    'no_msme': """Hii {wati_name} sir/madam! 🙏
 
 We're unable to proceed with your loan application as an MSME certificate is required for our collateral loan services. The MSME certificate is essential for us to categorize your business accurately and determine appropriate loan terms and benefits. We recommend you to apply for an MSME certificate through the official government portal Udyam Registration. 
 
 Once you've obtained your MSME certificate, please share it with us so we can move forward with your application process. 
 
 Thank you for your cooperation! 📄🔄""",
-            
-            'aadhar_pan_mismatch': """Hii {wati_name} sir/madam! 🙏
+    
+    'aadhar_pan_mismatch': """Hii {wati_name} sir/madam! 🙏
 
 During document verification, we found a mismatch between your Aadhaar and PAN card names. This discrepancy must be resolved before proceeding with your loan application. Please update your PAN card name to exactly match your Aadhaar card without any variations. Also, verify that your date of birth matches on both documents. If there's a mismatch in the date of birth, that needs to be corrected through the appropriate authorities. 
 
 Once updated, please inform us so we can continue processing your application. 🔄📋""",
-            
-            'msme_gst_address_different': """Hii {wati_name} sir/madam! 🙏
+    
+    'msme_gst_address_different': """Hii {wati_name} sir/madam! 🙏
 
 Our verification team found an address mismatch between your GST and MSME certificates. For compliance purposes, these addresses need to be consistent in our records. We request you to update your MSME address to match exactly with your GST address as per official documentation. Please ensure all your business documents reflect the same address to avoid any processing delays. Once you've made the necessary updates to your MSME certificate, please notify us so we can proceed with your application. 
 
 Thank you for your attention! 📍📝""",
-            
-            'will_call_back': """Hii {wati_name} sir/madam! 📞
+    
+    'will_call_back': """Hii {wati_name} sir/madam! 📞
 
 Thank you for your interest in Business Guru's collateral loan services. We appreciate your time and interest in our financial solutions. Currently, our representative is engaged with other calls, but we value your inquiry and want to ensure you receive proper attention and personalized service. 
 
 Please send a message to this number when you're available, and we'll call you back promptly to discuss your business loan requirements in detail. 
 
 Thank you for your understanding! 🕐💬""",
-            
-            'personal_loan': """Hii {wati_name} sir/madam! 🙏
+    
+    'personal_loan': """Hii {wati_name} sir/madam! 🙏
 
 Thank you for reaching out to Business Guru. We appreciate your interest in our financial services. However, we want to inform you that we specialize exclusively in collateral business loans and do not provide personal loans at this time. 
 
 Our expertise lies in supporting businesses with working capital, expansion, and equipment financing through secured loan options. If you have any business-related financing needs, we'd be happy to assist you. 
 
 Thank you for understanding! 🏢❌""",
-            
-            'startup': """Hii {wati_name} sir/madam! 🙏
+    
+    'startup': """Hii {wati_name} sir/madam! 🙏
 
 Thanks for reaching out to Business Guru. We appreciate your interest in our financial services. After careful consideration, we regret to inform you that we're currently unable to provide startup loans. Our collateral loan services are primarily designed for established businesses with proven track records and existing assets. 
 
 We encourage you to revisit our services once your business has been operational for a longer period. If you have any other business financing requirements, please let us know. 
 
 Thank you! 🚀.DataGridViewColumn""",
-            
-            'less_than_5_lakhs': """Hii {wati_name} sir/madam! 🙏
+    
+    'less_than_5_lakhs': """Hii {wati_name} sir/madam! 🙏
 
 We'd like to inform you about our loan policy regarding application amounts. Business Guru provides collateral loans ranging from 5 Lakhs to 5 Crores. Unfortunately, we're unable to process loan applications for amounts less than 5 Lakhs as they fall outside our current lending framework. We recommend consolidating your requirements or considering our services when your financing needs align with our specified range for better financial solutions.
 
 Thank you for your understanding! 💰.DataGridViewColumn""",
-            
-            'first_call_completed': """Hii {wati_name} sir/madam! 📞
+    
+    'first_call_completed': """Hii {wati_name} sir/madam! 📞
 
 We've attempted to reach you regarding your loan application but were unable to connect with you. Our team tried calling but there was no response and the call went unanswered. We believe it's important to discuss your application details and address any queries you might have. 
 
 Please call us back at your earliest convenience so we can continue processing your application without any further delays. 
 
 Thank you! 🕐🔁""",
-            
-            'second_call_completed': """Hii {wati_name} sir/madam! 📞
+    
+    'second_call_completed': """Hii {wati_name} sir/madam! 📞
 
 This is our second attempt to reach you regarding your loan application. Unfortunately, we were unable to connect with you again. Our team tried calling but there was no response and the call went unanswered. It's crucial that we discuss your application to ensure all requirements are met. 
 
 We request you to call us back as soon as possible to avoid any delays in processing your application. 
 
 Thank you for your attention! 🕓🔁""",
-            
-            'third_call_completed': """Hii {wati_name} sir/madam! 📞
+    
+    'third_call_completed': """Hii {wati_name} sir/madam! 📞
 
 This is our final attempt to reach you regarding your loan application. We've tried contacting you multiple times but have been unsuccessful in connecting with you. Our team has made several calls, but there has been no response and the calls remain unanswered. 
 
 This is a critical step in your application process. Please call us back immediately to prevent cancellation of your application. 
 
 Thank you! ⏰❗""",
-            
-            'switch_off': """Hii {wati_name} sir/madam! 📞
+    
+    'switch_off': """Hii {wati_name} sir/madam! 📞
 
 We've attempted to reach you regarding your loan application, but your phone number appears to be switched off. Our team tried calling but couldn't establish a connection. This prevents us from discussing important details about your application and addressing any questions you might have. 
 
 Please switch on your phone and call us back at your earliest convenience to continue with your application process. 
 
 Thank you! 📴🔁""",
-            
-            'not_connected': """Hii {wati_name} sir/madam! 📞
+    
+    'not_connected': """Hii {wati_name} sir/madam! 📞
 
 We've tried reaching you regarding your loan application, but your call is not connecting. Our team has made multiple attempts to call you, but the connection is not going through. This is preventing us from moving forward with your application and addressing any concerns you might have. 
 
 Please check your network connectivity and call us back as soon as possible to continue processing your application. 
 
 Thank you! 📶🔁""",
-            
-            'by_mistake': """Hii {wati_name} sir/madam! 🙏
+    
+    'by_mistake': """Hii {wati_name} sir/madam! 🙏
 
 We understand that your enquiry might have been submitted by mistake. No issues at all! We appreciate your transparency in informing us. Should you require any collateral loan services in the future, please don't hesitate to contact Business Guru. 
 
 We're always here to support your business financing needs. Feel free to reach out to us anytime for any collateral loan requirements. 
 
 Thank you and have a great day! 🌟😊"""
-        }
+}
+
+def _compile_template(template: str):
+    """Split a template into (literal, field) pairs once, so rendering skips str.format's placeholder scan"""
+    parts = tuple((literal, field) for literal, field, _, _ in string.Formatter().parse(template))
+    
+    def render(**fields) -> str:
+        return ''.join(literal if field is None else literal + str(fields[field]) for literal, field in parts)
+    
+    return render
+
+# Pre-parsed renderers for _MESSAGE_TEMPLATES, same keys
+_COMPILED_TEMPLATES = {name: _compile_template(template) for name, template in _MESSAGE_TEMPLATES.items()}
+
+@functools.lru_cache(maxsize=4096)
+def _format_phone_number_cached(phone_number: str) -> str:
+    """Format phone number for GreenAPI (pure, so results are cached per input)"""
+    # Handle None or empty phone number
+    if not phone_number:
+        logger.warning("📱 _format_phone_number - Empty phone number provided")
+        return ""
+    
+    # Fast path: already a normalized Indian number (91 + 10 digits)
+    phone_str = phone_number if isinstance(phone_number, str) else str(phone_number)
+    if len(phone_str) == 12 and phone_str.startswith('91') and phone_str.isdecimal():
+        return phone_str + '@c.us'
+    
+    # Remove any non-digit characters
+    clean_number = _NON_DIGIT_RE.sub('', phone_str)
+    
+    logger.debug("📱 _format_phone_number - Input: %s, Cleaned: %s, Length: %s", phone_number, clean_number, len(clean_number))
+    
+    # Handle different cases based on number length
+    if len(clean_number) == 0:
+        logger.warning("   ⚠️ Invalid phone number format (empty): %s", phone_number)
+        return ""
+    elif len(clean_number) < 10:
+        # Too short - might be missing country code, try to add India code
+        if len(clean_number) >= 8:
+            clean_number = '91' + clean_number
+            logger.info("   🇮🇳 Adding India country code 91 to short number: %s", clean_number)
+        else:
+            logger.warning("   ⚠️ Invalid phone number format (too short): %s", phone_number)
+    elif len(clean_number) == 10:
+        # Exactly 10 digits - assume it's an Indian number and add country code 91
+        clean_number = '91' + clean_number
+        logger.debug("   🇮🇳 Adding India country code 91 to 10-digit number: %s", clean_number)
+    elif len(clean_number) > 15:
+        # Too long - might be malformed, try to fix common issues
+        logger.warning("   ⚠️ Phone number too long: %s", phone_number)
+        # If it starts with country code, keep only first 12 digits (country code + 10 digits)
+        if clean_number.startswith('91') and len(clean_number) > 12:
+            clean_number = clean_number[:12]
+            logger.info("   ✂️ Truncated long Indian number: %s", clean_number)
+        elif len(clean_number) > 15:
+            # Keep only first 15 digits
+            clean_number = clean_number[:15]
+            logger.info("   ✂️ Truncated very long number: %s", clean_number)
+    
+    # GreenAPI expects format: 919876543210@c.us
+    formatted_number = f"{clean_number}@c.us"
+    logger.info("✅ Final formatted phone number: %s -> %s", phone_number, formatted_number)
+    return formatted_number
+
+class GreenAPIWhatsAppService:
+    """WhatsApp service using GreenAPI - NO OTP REQUIRED"""
+    
+    def __init__(self):
+        self.instance_id = os.getenv('GREENAPI_INSTANCE_ID')
+        self.token = os.getenv('GREENAPI_TOKEN')
+        
+        logger.info(f"🔧 GreenAPI Initialization:")
+        logger.info(f"   Instance ID: {self.instance_id}")
+        logger.info(f"   Token: {'Present' if self.token else 'Missing'}")
+        
+        if self.instance_id and self.token:
+            # Use the correct GreenAPI endpoint format
+            self.base_url = "https://api.green-api.com"
+            self._send_url = f"{self.base_url}/waInstance{self.instance_id}/sendMessage/{self.token}"
+            self._status_url = f"{self.base_url}/waInstance{self.instance_id}/getStateInstance/{self.token}"
+            
+            if HTTPX_AVAILABLE:
+                # One HTTP/2 connection: multiplexed streams and HPACK-compressed headers
+                self._client = httpx.Client(
+                    timeout=30.0,
+                    transport=httpx.HTTPTransport(
+                        http2=True,
+                        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                        retries=3
+                    )
+                )
+                self._session = None
+            else:
+                # Pooled keep-alive session so back-to-back sends skip the TLS handshake
+                self._client = None
+                self._session = requests.Session()
+                self._session.headers['Connection'] = 'keep-alive'
+                self._session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=_RETRY))
+            
+            self.api_available = True
+            logger.info(f"✅ GreenAPI WhatsApp Service initialized - NO OTP REQUIRED")
+            logger.info(f"   Instance ID: {self.instance_id}")
+            logger.info(f"   Base URL: {self.base_url}")
+            # Request URL and headers never change, so they are logged here rather than per send
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📤 Send URL: %s", self._send_url)
+                logger.debug("📤 Headers: %s", _JSON_HEADERS)
+        else:
+            self.api_available = False
+            logger.error("❌ GreenAPI credentials not found in .env file")
+            logger.error(f"   Missing: GREENAPI_INSTANCE_ID={bool(self.instance_id)}, GREENAPI_TOKEN={bool(self.token)}")
+    
+    def _post_json(self, url: str, body: bytes):
+        """
+        POST a pre-encoded JSON body over the HTTP/2 client (or the requests session fallback),
+        retrying 429/5xx answers with backoff; the last response is returned once attempts run out
+        """
+        for attempt in range(_SEND_MAX_ATTEMPTS):
+            # Every attempt counts against the sendMessage limit
+            _send_bucket.acquire()
+            if self._client is not None:
+                response = self._client.post(url, content=body, headers=_JSON_HEADERS)
+            else:
+                response = self._session.post(url, data=body, headers=_JSON_HEADERS, timeout=30)
+            
+            if response.status_code not in _RETRY_STATUSES or attempt == _SEND_MAX_ATTEMPTS - 1:
+                return response
+            
+            delay = _retry_delay(response, attempt)
+            logger.warning("⏳ GreenAPI HTTP %s - retrying in %.1fs", response.status_code, delay)
+            time.sleep(delay)
+    
+    def _get(self, url: str, timeout: float):
+        """GET over the HTTP/2 client (or the requests session fallback)"""
+        if self._client is not None:
+            return self._client.get(url, timeout=timeout)
+        return self._session.get(url, timeout=timeout)
+    
+    def send_message(self, phone_number: str, message: str) -> Dict[str, Any]:
+        """
+        Send WhatsApp message via GreenAPI (no OTP required)
+        
+        Args:
+            phone_number (str): Phone number with country code
+            message (str): Message text
+            
+        Returns:
+            Dict: Response from GreenAPI
+        """
+        if not self.api_available:
+            return {**_ERR_NO_CREDS}
+        
+        try:
+            # Format phone number for GreenAPI
+            formatted_number = self._format_phone_number(phone_number)
+            
+            logger.info("🚀 GreenAPI - Sending to %s (NO OTP REQUIRED)", formatted_number)
+            logger.debug("📱 Original phone number: %s", phone_number)
+            
+            url = self._send_url
+            
+            # Prepare data with proper structure
+            data = {
+                "chatId": formatted_number,
+                "message": message
+            }
+            
+            body = orjson.dumps(data)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("📤 GreenAPI Payload: %s", body.decode())
+            
+            # Send request with timeout and headers
+            response = self._post_json(url, body)
+            response_data = orjson.loads(response.content) if response.content else {}
+            
+            logger.info("📥 GreenAPI Response Status Code: %s", response.status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📥 GreenAPI Response Headers: %s", dict(response.headers))
+            if logger.isEnabledFor(logging.INFO):
+                # The body is already JSON - log the raw bytes instead of re-serializing the parsed dict
+                logger.info("📥 GreenAPI Response Data: %s", response.content.decode('utf-8', 'replace') if response_data else 'No response data')
+            
+            if response.status_code == 200 and response_data.get('idMessage'):
+                logger.info(f"✅ GreenAPI SUCCESS! Message sent to {formatted_number}")
+                return {**_SEND_SUCCESS_BASE, 'message_id': response_data['idMessage'], 'response': response_data}
+            else:
+                # Handle different error cases
+                if response.status_code == 466:
+                    # Special handling for GreenAPI quota exceeded error
+                    error_msg = response_data.get('invokeStatus', {}).get('description', 'Monthly quota exceeded')
+                    if not error_msg or error_msg == 'Monthly quota exceeded':
+                        error_msg = 'Monthly quota has been exceeded. Upgrade your GreenAPI plan to send to more numbers'
+                    hint = _QUOTA_EXCEEDED_HINT
+                else:
+                    default_msg, hint = _STATUS_HINTS.get(
+                        response.status_code,
+                        (f'Unknown GreenAPI error (Status: {response.status_code})', None)
+                    )
+                    error_msg = response_data.get('message', default_msg)
+                
+                logger.error(f"❌ GreenAPI FAILED: {error_msg}")
+                logger.error(f"❌ Status Code: {response.status_code}")
+                logger.error("❌ Response Data: %s", orjson.dumps(response_data).decode() if response_data else 'No response data')
+                
+                # Provide more detailed error information
+                detailed_error = f'GreenAPI error: {error_msg}'
+                if hint:
+                    detailed_error += f' ({hint})'
+                
+                result = {
+                    **_SEND_ERROR_BASE,
+                    'error': detailed_error,
+                    'status_code': response.status_code,
+                    'response': response_data,
+                    'original_phone_number': phone_number,
+                    'formatted_phone_number': formatted_number
+                }
+                
+                # Add quota-specific information for 466 errors
+                if response.status_code == 466:
+                    result.update(_QUOTA_EXCEEDED_EXTRAS)
+                
+                return result
+                
+        except _NETWORK_ERRORS as e:
+            logger.error(f"❌ GreenAPI Network error: {str(e)}")
+            return {**_SEND_ERROR_BASE, 'error': f'GreenAPI network error: {str(e)}', 'original_phone_number': phone_number}
+        except Exception as e:
+            logger.exception("❌ GreenAPI Unexpected error: %s", e)
+            return {**_SEND_ERROR_BASE, 'error': f'GreenAPI unexpected error: {str(e)}', 'original_phone_number': phone_number}
+    
+    def _format_phone_number(self, phone_number: str) -> str:
+        """Format phone number for GreenAPI"""
+        return _format_phone_number_cached(phone_number)
+    
+    def check_status(self) -> Dict[str, Any]:
+        """Check GreenAPI connection status"""
+        if not self.api_available:
+            return {
+                'connected': False,
+                'error': 'GreenAPI credentials not configured'
+            }
+        
+        try:
+            url = self._status_url
+            
+            logger.info(f"📡 Checking GreenAPI status: {url}")
+            _status_bucket.acquire()
+            response = self._get(url, timeout=15)
+            
+            logger.info(f"📡 Status Code: {response.status_code}")
+            
+            if response.status_code == 200:
+                response_data = orjson.loads(response.content)
+                logger.debug("📡 GreenAPI Status Response: %s", response_data)
+                
+                state = response_data.get('stateInstance', 'unknown')
+                return {
+                    'connected': state == 'authorized',
+                    'state': state,
+                    'status': response_data,
+                    'service': 'GreenAPI',
+                    'endpoint': url
+                }
+            else:
+                error_text = response.text
+                logger.error(f"📡 GreenAPI Error Response: {error_text}")
+                return {
+                    'connected': False,
+                    'error': f'GreenAPI HTTP {response.status_code}: {error_text}',
+                    'service': 'GreenAPI',
+                    'endpoint': url
+                }
+                
+        except _TIMEOUT_ERRORS:
+            logger.error("📡 GreenAPI request timeout")
+            return {
+                'connected': False,
+                'error': 'GreenAPI request timeout (15 seconds)',
+                'service': 'GreenAPI'
+            }
+        except Exception as e:
+            logger.error(f"📡 GreenAPI status check error: {str(e)}")
+            return {
+                'connected': False,
+                'error': f'GreenAPI status check error: {str(e)}',
+                'service': 'GreenAPI'
+            }
+    
+    def get_message_templates(self) -> Dict[str, str]:
+        """
+        Get predefined message templates for different enquiry scenarios
+        
+        Returns:
+            Dict: Dictionary of template names and messages
+        """
+        return _MESSAGE_TEMPLATES
     
     def send_staff_assignment_messages(self, enquiry_data: Dict[str, Any], staff_name: str) -> Dict[str, Any]:
         """
@@ -542,7 +664,8 @@ Working Hours : 10.00AM - 6.00PM"""
             # Message 3: Loan amount request
             message3 = "And what is the loan amount you require"
             
-            # Send messages sequentially
+            # Send messages sequentially - each one is only posted after GreenAPI has
+            # queued the previous one, and its queue delivers in arrival order
             messages = [message1, message2, message3]
             results = []
             
@@ -560,10 +683,6 @@ Working Hours : 10.00AM - 6.00PM"""
                         'messages_sent': i,
                         'results': results
                     }
-                
-                # Add a small delay between messages to ensure proper delivery order
-                import time
-                time.sleep(1)
             
             logger.info(f"Successfully sent all staff assignment messages to {mobile_number}")
             return {
@@ -592,20 +711,15 @@ Working Hours : 10.00AM - 6.00PM"""
             Dict: Result of message sending
         """
         try:
-            templates = self.get_message_templates()
-            
-            if message_type not in templates:
+            if message_type not in _MESSAGE_TEMPLATES:
                 logger.error(f"Unknown message type: {message_type}")
                 return {
                     'success': False,
                     'error': f'Unknown message type: {message_type}'
                 }
             
-            # Get message template
-            message_template = templates[message_type]
-            
-            # Format message with enquiry data
-            formatted_message = message_template.format(
+            # Format message template with enquiry data
+            formatted_message = _COMPILED_TEMPLATES[message_type](
                 wati_name=enquiry_data.get('wati_name', 'Customer'),
                 business_nature=enquiry_data.get('business_nature', 'your business')
             )
@@ -806,9 +920,7 @@ try:
         logger.warning("⚠️ GreenAPI WhatsApp Service created but not available (missing credentials)")
         
 except Exception as e:
-    logger.error(f"❌ Failed to initialize GreenAPI Service: {e}")
-    import traceback
-    logger.error(f"Traceback: {traceback.format_exc()}")
+    logger.exception(f"❌ Failed to initialize GreenAPI Service: {e}")
     greenapi_service = None
     whatsapp_service = None
 
@@ -0,0 +1,29 @@
+"""
+Shared rate limiting - a token bucket for throttling calls to external APIs
+"""
+
+import time
+import threading
+
+class TokenBucket:
+    """Thread-safe token bucket holding up to capacity tokens, refilled at rate per second"""
+    
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
@@ -1,9 +1,14 @@
+from flask import request
 from flask_socketio import emit, join_room, leave_room
 from datetime import datetime
 import uuid
 import threading
 import time
 
+# Every client joins this room on connect; enquiry broadcasts target it so
+# they are serialized once for the room, not per client
+STAFF_ENQUIRIES_ROOM = 'staff_enquiries'
+
 # Store for pending approval requests and admin sessions
 pending_approvals = {}
 admin_sessions = {}
@@ -13,14 +18,17 @@ def init_socketio_handlers(socketio, users_collection):
     
     @socketio.on('connect')
     def on_connect():
-        print(f'Client connected: {socketio.request.sid}')
+        # Enquiry broadcasts target this room rather than every socket, so
+        # join it before anything else can fail
+        join_room(STAFF_ENQUIRIES_ROOM)
+        print(f'Client connected: {request.sid}')
 
     @socketio.on('disconnect')
     def on_disconnect():
-        print(f'Client disconnected: {socketio.request.sid}')
+        print(f'Client disconnected: {request.sid}')
         # Remove from admin sessions if it was an admin
-        if socketio.request.sid in admin_sessions:
-            del admin_sessions[socketio.request.sid]
+        if request.sid in admin_sessions:
+            del admin_sessions[request.sid]
 
     @socketio.on('admin_login')
     def on_admin_login(data):
@@ -30,12 +38,12 @@ def init_socketio_handlers(socketio, users_collection):
             role = data.get('role')
             
             if role == 'admin':
-                admin_sessions[socketio.request.sid] = {
+                admin_sessions[request.sid] = {
                     'user_id': user_id,
                     'connected_at': datetime.utcnow()
                 }
                 join_room('admins')
-                print(f'Admin {user_id} joined approval room: {socketio.request.sid}')
+                print(f'Admin {user_id} joined approval room: {request.sid}')
                 emit('admin_registered', {'status': 'success'})
         except Exception as e:
             print(f'Error in admin_login: {e}')
@@ -60,7 +68,7 @@ def init_socketio_handlers(socketio, users_collection):
                 # Save user to database
                 user_data['status'] = 'active'
                 user_data['approved_at'] = datetime.utcnow()
-                user_data['approved_by'] = admin_sessions.get(socketio.request.sid, {}).get('user_id', 'unknown')
+                user_data['approved_by'] = admin_sessions.get(request.sid, {}).get('user_id', 'unknown')
                 
                 result = users_collection.insert_one(user_data)
                 
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script to verify connected clients join the staff enquiries room
+and receive room-targeted enquiry broadcasts
+"""
+
+import sys
+import os
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from flask_socketio import SocketIO
+from socketio_handlers import init_socketio_handlers, STAFF_ENQUIRIES_ROOM
+
+def _make_app():
+    """Minimal app wired like app.py's SocketIO setup"""
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading')
+    init_socketio_handlers(socketio, None)
+    return app, socketio
+
+def test_connect_joins_staff_room():
+    """A connected client receives new_enquiry emitted to the staff room"""
+    print("\n🔍 Testing: new_enquiry reaches a connected client")
+    app, socketio = _make_app()
+    client = socketio.test_client(app)
+    assert client.is_connected()
+
+    rooms = socketio.server.manager.rooms.get('/', {})
+    assert rooms.get(STAFF_ENQUIRIES_ROOM), "client did not join the staff room"
+
+    socketio.emit('new_enquiry', {'_id': 'test'}, room=STAFF_ENQUIRIES_ROOM)
+    received = [event for event in client.get_received() if event['name'] == 'new_enquiry']
+    assert received and received[0]['args'][0] == {'_id': 'test'}
+    print("   ✅ SUCCESS")
+
+    client.disconnect()
+
+def test_has_listeners_sees_connected_client():
+    """enquiry routes' listener check sees the connected client"""
+    print("\n🔍 Testing: _has_listeners with a connected client")
+    import enquiry_routes_broken
+
+    app, socketio = _make_app()
+    enquiry_routes_broken._socketio = socketio
+    try:
+        assert not enquiry_routes_broken._has_listeners()
+        client = socketio.test_client(app)
+        assert enquiry_routes_broken._has_listeners()
+        client.disconnect()
+        assert not enquiry_routes_broken._has_listeners()
+        print("   ✅ SUCCESS")
+    finally:
+        enquiry_routes_broken._socketio = None
+
+if __name__ == "__main__":
+    test_connect_joins_staff_room()
+    test_has_listeners_sees_connected_client()